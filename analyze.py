@@ -0,0 +1,257 @@
+# Offline routing tables of every router in a topology or an LSDB dump
+# Usage: python analyze.py FILE [ID ...] [--all] [--verify] [--python]
+# FILE is an LSDB written by a router's "dump" command (one "ID,Seq,linkID:cost;..." line per LSA) or a
+# topology with one "A B [COST]" line per two-way link, cost 1 if not given.
+# Prints a summary and the routing table of each router ID given (every router with --all), in the
+# form of the "rt" command. With NumPy all tables come from one Dijkstra run for BLOCK routers at a
+# time on flat arrays, without it (or with --python) from one Routing.calc_spf per router.
+# --verify recomputes the tables printed, or 20 routers spread over the LSDB, with Routing.calc_spf.
+import sys, time
+import wire
+from wire import LSA, Links
+from ospf import Routing, Route, summary_ABR
+try:
+    import numpy as np
+except ImportError: # Fall back to Routing.calc_spf per router
+    np = None
+
+BLOCK = 64 # Routers run together, arrays are BLOCK x routers
+VERIFY_COUNT = 20 # Routers checked by --verify when no ID is given
+
+def load(path: str) -> dict: # Return {ID: LSA}
+    with open(path) as f:
+        lines = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+    if lines and ',' in lines[0]: # LSDB dump
+        return {lsa.id: lsa for lsa in wire.parse_LSU('\n'.join(lines))}
+    links = {}
+    for line in lines:
+        fields = line.split()
+        aID, bID = int(fields[0]), int(fields[1])
+        cost = int(fields[2]) if len(fields) > 2 else 1
+        links.setdefault(aID, {})[bID] = cost
+        links.setdefault(bID, {})[aID] = cost
+    return {id: LSA(id, 1, Links(linkTable)) for id, linkTable in links.items()}
+
+##### Routing.calc_spf #####
+def spf_table(lsdb, id: int) -> dict: # {dstID: Route} of one router
+    routing = Routing(id, log=lambda message: None)
+    routing.calc_spf(lsdb)
+    return routing.table
+
+def spf_tables(lsdb, ids): # Yield (ID, {dstID: Route}) per router
+    for id in ids:
+        yield id, spf_table(lsdb, id)
+
+##### Batched #####
+class AllPairs: # Shortest paths from BLOCK routers at a time over the whole LSDB
+    # Dijkstra for every router of a block at once, one cost level at a time: all (router, node) pairs
+    # at the lowest unsettled cost are settled together and their links relaxed as flat index arrays,
+    # zero-cost links are relaxed again within the level. Next hops are bit masks over the links of
+    # each router, filled level by level from the links on a shortest path into each node: a router's
+    # own link sets its bit, any other link passes on the bits of its tail, as in Routing.__dijkstra.
+    # Links into the router itself and into its own summary LSAs are never relaxed. Summary LSAs are no
+    # destination and no router of the LSDB.
+    def __init__(self, lsdb):
+        self.lsdb = lsdb
+        newIDs = set(lsdb).union(*(lsa.linkTable for lsa in lsdb.values())) # Linked routers may have no LSA
+        self.ids = sorted(newIDs) # ID of each index
+        self.index = {id: i for i, id in enumerate(self.ids)}
+        n = len(self.ids)
+        self.isRouter = np.array([id > 0 for id in self.ids], dtype=bool)
+        self.abrOf = np.array([self.index.get(summary_ABR(id), -1) if id < 0 else -1 for id in self.ids],
+                              dtype=np.int64) # Index of the ABR of each summary LSA
+        src, dst, cost, pos = [], [], [], [] # Links by tail, pos: place of the link in its LSA
+        degree = np.zeros(n + 1, dtype=np.int64)
+        for i, id in enumerate(self.ids):
+            if id in lsdb:
+                # Links SPF may use, as in Routing: both ends advertise it or the other end has no LSA
+                links = [(k, nbID, linkCost) for k, (nbID, linkCost) in enumerate(lsdb[id].linkTable.items())
+                         if nbID not in lsdb or id in lsdb[nbID].linkTable]
+                degree[i + 1] = len(links)
+                src += [i] * len(links)
+                dst += [self.index[nbID] for k, nbID, linkCost in links]
+                cost += [linkCost for k, nbID, linkCost in links]
+                pos += [k for k, nbID, linkCost in links]
+        self.outStart = np.cumsum(degree) # Links of node i are outStart[i]:outStart[i + 1]
+        self.outDst = np.array(dst, dtype=np.int64)
+        self.outCost = np.array(cost, dtype=np.int64)
+        order = np.argsort(self.outDst, kind="stable") # Links by head
+        self.inStart = np.r_[0, np.cumsum(np.bincount(self.outDst, minlength=n))]
+        self.inSrc = np.array(src, dtype=np.int64)[order]
+        self.inCost = self.outCost[order]
+        self.inPos = np.array(pos, dtype=np.int64)[order]
+        self.inf = np.iinfo(np.int64).max // 4
+
+    def blocks(self, ids): # Yield (IDs, costs, masks), costs[r, i] is inf when ids[i] is not reached
+        ids = list(ids)
+        n = len(self.ids)
+        for b in range(0, len(ids), BLOCK):
+            blockIDs = ids[b:b + BLOCK]
+            selfIdx = np.array([self.index[id] for id in blockIDs], dtype=np.int64)
+            costs, levels = self.__costs(selfIdx)
+            masks = self.__masks(blockIDs, selfIdx, costs, levels)
+            yield blockIDs, costs.reshape(len(blockIDs), n), masks.reshape(len(blockIDs), n, -1)
+
+    @staticmethod
+    def __expand(nodes, start): # Link indexes of each node and the position in nodes they belong to
+        counts = start[nodes + 1] - start[nodes]
+        owner = np.repeat(np.arange(len(nodes)), counts)
+        first = np.cumsum(counts) - counts
+        return np.repeat(start[nodes], counts) + np.arange(counts.sum()) - first[owner], owner
+
+    def __costs(self, selfIdx): # Costs of block rows flattened to row * n + node, and the pairs settled per level
+        n = len(self.ids)
+        costs = np.full(len(selfIdx) * n, self.inf, dtype=np.int64)
+        settled = np.zeros(len(selfIdx) * n, dtype=bool)
+        selfFlat = np.arange(len(selfIdx)) * n + selfIdx
+        costs[selfFlat] = 0
+        levels = [] # (cost, flat indexes settled at that cost)
+        while True:
+            waiting = np.where(settled, self.inf, costs)
+            level = waiting.min()
+            if level == self.inf:
+                break
+            frontier = np.flatnonzero(waiting == level)
+            done = []
+            while len(frontier):
+                settled[frontier] = True
+                done.append(frontier)
+                links, owner = self.__expand(frontier % n, self.outStart)
+                rows = frontier[owner] // n
+                heads = self.outDst[links]
+                newCosts = level + self.outCost[links]
+                keep = (heads != selfIdx[rows]) & (self.abrOf[heads] != selfIdx[rows]) # Never into the router itself or its summaries
+                flat = rows[keep] * n + heads[keep]
+                newCosts = newCosts[keep]
+                better = newCosts < costs[flat]
+                np.minimum.at(costs, flat[better], newCosts[better])
+                frontier = np.empty(0, dtype=np.int64)
+                if (newCosts[better] == level).any(): # Over zero-cost links, settled in this level
+                    frontier = np.flatnonzero((costs == level) & ~settled)
+            levels.append((int(level), np.concatenate(done)))
+        return costs, levels
+
+    def __masks(self, blockIDs, selfIdx, costs, levels): # Next-hop bit masks, flattened like costs
+        n = len(self.ids)
+        words = max([(len(self.lsdb[id].linkTable) + 63) // 64 for id in blockIDs if id in self.lsdb] + [1])
+        masks = np.zeros((len(blockIDs) * n, words), dtype=np.uint64)
+        one = np.uint64(1)
+        for level, flat in levels:
+            flat = flat[flat % n != selfIdx[flat // n]] # The router itself has no next hops
+            if not len(flat):
+                continue
+            links, owner = self.__expand(flat % n, self.inStart)
+            rows = flat[owner] // n
+            tails = self.inSrc[links]
+            tailFlat = rows * n + tails
+            tight = costs[tailFlat] + self.inCost[links] == level # Link on a shortest path
+            own = tight & (tails == selfIdx[rows])
+            passOn = tight & ~own
+            ownBits = np.zeros((len(links), words), dtype=np.uint64)
+            ownPos = self.inPos[links[own]]
+            ownBits[np.flatnonzero(own), ownPos // 64] = one << (ownPos % 64).astype(np.uint64)
+            segments = np.r_[0, np.flatnonzero(np.diff(owner)) + 1] # Every node here has a link in
+            zeroCost = (passOn & (self.inCost[links] == 0)).any()
+            while True: # More than once only when zero-cost links pass bits within the level
+                bits = ownBits | np.where(passOn[:, None], masks[tailFlat], np.uint64(0))
+                new = np.bitwise_or.reduceat(bits, segments, axis=0)
+                if not zeroCost or (new == masks[flat]).all():
+                    masks[flat] = new
+                    break
+                masks[flat] = new
+        return masks
+
+    def table(self, id: int, costs, masks) -> dict: # {dstID: Route} from one row of a block
+        lsa = self.lsdb.get(id)
+        nbIDs = list(lsa.linkTable) if lsa else []
+        hopTuples = {} # {mask: nextHopIDs}
+        table = {}
+        for i in np.flatnonzero(costs < self.inf):
+            dstID = self.ids[i]
+            if dstID == id or dstID < 0: # Summary LSAs are no destination
+                continue
+            mask = masks[i].tobytes()
+            nextHopIDs = hopTuples.get(mask)
+            if nextHopIDs is None:
+                bits = sum(int(word) << (64 * w) for w, word in enumerate(masks[i]))
+                nextHopIDs = hopTuples[mask] = tuple(sorted(nbIDs[k] for k in range(len(nbIDs)) if bits >> k & 1))
+            table[dstID] = Route(nextHopIDs, int(costs[i]))
+        return table
+
+    def tables(self, ids): # Yield (ID, {dstID: Route}) per router
+        for blockIDs, costs, masks in self.blocks(ids):
+            for r, id in enumerate(blockIDs):
+                yield id, self.table(id, costs[r], masks[r])
+
+def summary(allPairs: AllPairs, ids) -> dict: # Counts over every table without building them
+    reached = multipath = 0
+    diameter = 0
+    for blockIDs, costs, masks in allPairs.blocks(ids):
+        found = (costs < allPairs.inf) & allPairs.isRouter # Routers only, no summary LSA or default route
+        reached += int(found.sum()) - len(blockIDs) # Not the router itself
+        bits = np.unpackbits(masks.view(np.uint8), axis=2).sum(axis=2)
+        multipath += int(((bits > 1) & allPairs.isRouter).sum())
+        diameter = max(diameter, int(costs[found].max()))
+    return {"reached": reached, "multipath": multipath, "diameter": diameter}
+
+##### Output #####
+def print_table(id: int, table: dict):
+    print(id, {dstID: list(route) for dstID, route in sorted(table.items())})
+
+def main():
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    flags = {arg for arg in sys.argv[1:] if arg.startswith("--")}
+    if not args or flags - {"--all", "--verify", "--python"}:
+        print("analyze.py FILE [ID ...] [--all] [--verify] [--python]")
+        return
+    lsdb = load(args[0])
+    ids = sorted(id for id in lsdb if id > 0) # Without summary LSAs and the default route
+    try:
+        shown = ids if "--all" in flags else [int(id) for id in args[1:]]
+    except ValueError:
+        print("Router IDs must be integers")
+        return
+    batched = np is not None and "--python" not in flags
+    knownIDs = {id for id in set(lsdb).union(*(lsa.linkTable for lsa in lsdb.values())) if id > 0}
+    unknownIDs = [id for id in shown if id not in knownIDs]
+    if unknownIDs:
+        print("Unknown router IDs:", ' '.join(str(id) for id in unknownIDs))
+        return
+    print(len(lsdb), "LSAs,", sum(len(lsa.linkTable) for lsa in lsdb.values()), "links,",
+          "NumPy, %d routers at a time" % BLOCK if batched else "Routing.calc_spf per router")
+
+    start = time.time()
+    if batched:
+        allPairs = AllPairs(lsdb)
+        counts = summary(allPairs, ids)
+        tables = allPairs.tables(shown)
+    else:
+        counts = {"reached": 0, "multipath": 0, "diameter": 0}
+        shownTables = {}
+        for id, table in spf_tables(lsdb, ids):
+            routes = [route for dstID, route in table.items() if dstID > 0] # Not the default route
+            counts["reached"] += len(routes)
+            counts["multipath"] += sum(1 for route in routes if len(route.nextHopIDs) > 1)
+            counts["diameter"] = max([counts["diameter"]] + [route.cost for route in routes])
+            if id in shown:
+                shownTables[id] = table
+        tables = ((id, shownTables.get(id, {})) for id in shown)
+    print("%d routes, %d unreachable, %d with equal-cost next hops, largest cost %d, %.2f s"
+          % (counts["reached"], len(ids) * (len(knownIDs) - 1) - counts["reached"], counts["multipath"],
+             counts["diameter"], time.time() - start))
+    for id, table in tables:
+        print_table(id, table)
+
+    if "--verify" in flags:
+        if not batched:
+            print("Nothing to verify, tables came from Routing.calc_spf")
+            return
+        verifyIDs = shown or ids[::max(1, len(ids) // VERIFY_COUNT)]
+        mismatched = [id for id, table in allPairs.tables(verifyIDs) if table != spf_table(lsdb, id)]
+        if mismatched:
+            print("Differs from Routing.calc_spf for routers", ' '.join(str(id) for id in mismatched))
+        else:
+            print("Same as Routing.calc_spf for", len(verifyIDs), "routers")
+
+if __name__ == '__main__':
+    main()
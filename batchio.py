@@ -0,0 +1,144 @@
+# Batched UDP receive and send for ospf.py
+# A Batch holds count receive slots of size bytes. recv() fills slots with every datagram waiting on a
+# non-blocking socket, up to count, in one recvmmsg() call, and send() copies a list of datagrams into one
+# send arena and hands them to sendmmsg(), count at a time. Both come from libc through ctypes on Linux.
+# Elsewhere, or when libc lacks them, the same calls loop over recvfrom_into()/sendto().
+# The kernel headers are filled through flat memoryviews, a ctypes field access per datagram costs more
+# than the system call saves. Datagrams received stay valid in their slots until the next recv().
+import ctypes, ctypes.util, socket, struct
+
+TX_ARENA = 65536 # Bytes copied per sendmmsg(), a longer datagram goes out with sendto()
+
+class IOVec(ctypes.Structure):
+    _fields_ = [("base", ctypes.c_void_p), ("len", ctypes.c_size_t)]
+
+class MsgHdr(ctypes.Structure):
+    _fields_ = [("name", ctypes.c_void_p), ("namelen", ctypes.c_uint32), ("iov", ctypes.POINTER(IOVec)),
+                ("iovlen", ctypes.c_size_t), ("control", ctypes.c_void_p), ("controllen", ctypes.c_size_t),
+                ("flags", ctypes.c_int)]
+
+class MMsgHdr(ctypes.Structure):
+    _fields_ = [("hdr", MsgHdr), ("len", ctypes.c_uint)]
+
+class SockAddrIn(ctypes.Structure): # Port and address in network byte order
+    _fields_ = [("family", ctypes.c_ushort), ("port", ctypes.c_ushort), ("addr", ctypes.c_uint32),
+                ("zero", ctypes.c_char * 8)]
+
+# Strides and offsets in the flat views, in units of the view's item
+IOV_WORDS = ctypes.sizeof(IOVec) // ctypes.sizeof(ctypes.c_size_t)
+HDR_UINTS = ctypes.sizeof(MMsgHdr) // ctypes.sizeof(ctypes.c_uint)
+LEN_UINT = MMsgHdr.len.offset // ctypes.sizeof(ctypes.c_uint)
+ADDR_SHORTS = ctypes.sizeof(SockAddrIn) // ctypes.sizeof(ctypes.c_ushort)
+PORT_SHORT = SockAddrIn.port.offset // ctypes.sizeof(ctypes.c_ushort)
+
+def load_libc(): # libc with recvmmsg and sendmmsg, None where they are missing
+    if not hasattr(socket, "AF_INET") or not ctypes.util.find_library("c"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        libc.recvmmsg.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_uint, ctypes.c_int, ctypes.c_void_p]
+        libc.sendmmsg.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_uint, ctypes.c_int]
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+LIBC = load_libc()
+MSG_DONTWAIT = getattr(socket, "MSG_DONTWAIT", 0)
+
+def make_headers(count: int, bufAddr: int, bufLen: int) -> tuple: # (mmsghdrs, iovecs, addresses), iovec i at bufAddr + i*bufLen
+    addrs = (SockAddrIn * count)()
+    iovs = (IOVec * count)()
+    hdrs = (MMsgHdr * count)()
+    for i in range(count):
+        addrs[i].family = socket.AF_INET
+        iovs[i].base = bufAddr + i * bufLen
+        iovs[i].len = bufLen
+        hdr = hdrs[i].hdr
+        hdr.name = ctypes.addressof(addrs[i])
+        hdr.namelen = ctypes.sizeof(SockAddrIn)
+        hdr.iov = ctypes.pointer(iovs[i])
+        hdr.iovlen = 1
+    return hdrs, iovs, addrs
+
+class Batch:
+    def __init__(self, sock, ip: str, count: int, size: int, native: bool=True):
+        self.sock = sock
+        self.ip = ip
+        self.count = count
+        self.native = native and LIBC is not None # recvmmsg/sendmmsg, else the portable loop
+        self.buf = bytearray(count * size)
+        view = memoryview(self.buf)
+        self.slots = [view[i * size:(i + 1) * size] for i in range(count)]
+        if not self.native:
+            return
+        self.rxHdrs, self.rxIOVs, self.rxAddrs = make_headers(count, ctypes.addressof(ctypes.c_char.from_buffer(self.buf)), size)
+        self.rxLens = memoryview(self.rxHdrs).cast('B').cast('I')
+        self.rxPorts = memoryview(self.rxAddrs).cast('B').cast('H')
+        self.arena = bytearray(TX_ARENA)
+        self.arenaAddr = ctypes.addressof(ctypes.c_char.from_buffer(self.arena))
+        self.txHdrs, self.txIOVs, self.txAddrs = make_headers(count, self.arenaAddr, 0)
+        ipNumber = struct.unpack("=I", socket.inet_aton(ip))[0]
+        for addr in self.txAddrs:
+            addr.addr = ipNumber
+        self.txWords = memoryview(self.txIOVs).cast('B').cast('N')
+        self.txPorts = memoryview(self.txAddrs).cast('B').cast('H')
+
+    def recv(self) -> list: # [(datagram, port)] of the datagrams waiting, each a memoryview of its slot
+        if self.native:
+            n = LIBC.recvmmsg(self.sock.fileno(), ctypes.addressof(self.rxHdrs), self.count, MSG_DONTWAIT, None)
+            if n <= 0: # Nothing waiting, or an ICMP error of an earlier send
+                return []
+            lens, ports, slots, ntohs = self.rxLens, self.rxPorts, self.slots, socket.ntohs
+            return [(slots[i][:lens[i * HDR_UINTS + LEN_UINT]], ntohs(ports[i * ADDR_SHORTS + PORT_SHORT]))
+                    for i in range(n)]
+        received = []
+        for slot in self.slots:
+            try:
+                size, addr = self.sock.recvfrom_into(slot)
+            except OSError:
+                break
+            received.append((slot[:size], addr[1]))
+        return received
+
+    def send(self, packets) -> int: # packets: [(dataBytes, port)], return how many the socket took
+        if not self.native:
+            return sum(self.send_one(dataBytes, port) for dataBytes, port in packets)
+        arena, arenaAddr, words, ports, htons = self.arena, self.arenaAddr, self.txWords, self.txPorts, socket.htons
+        sent = n = used = 0
+        for dataBytes, port in packets:
+            size = len(dataBytes)
+            if size > TX_ARENA:
+                sent += self.send_one(dataBytes, port)
+                continue
+            if n == self.count or used + size > TX_ARENA:
+                sent += self.send_arena(n)
+                n = used = 0
+            arena[used:used + size] = dataBytes
+            words[n * IOV_WORDS] = arenaAddr + used
+            words[n * IOV_WORDS + 1] = size
+            ports[n * ADDR_SHORTS + PORT_SHORT] = htons(port)
+            used += size
+            n += 1
+        if n:
+            sent += self.send_arena(n)
+        return sent
+
+    def send_arena(self, n: int) -> int: # First n datagrams of the arena
+        fd = self.sock.fileno()
+        hdrsAddr = ctypes.addressof(self.txHdrs)
+        sent = done = 0
+        while done < n:
+            k = LIBC.sendmmsg(fd, hdrsAddr + done * ctypes.sizeof(MMsgHdr), n - done, MSG_DONTWAIT)
+            if k <= 0: # Full socket buffer or a bad datagram, drop it and go on with the next one
+                done += 1
+                continue
+            done += k
+            sent += k
+        return sent
+
+    def send_one(self, dataBytes, port: int) -> int:
+        try:
+            self.sock.sendto(dataBytes, (self.ip, port))
+        except OSError: # Full socket buffer, the datagram is dropped
+            return 0
+        return 1
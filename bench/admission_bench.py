@@ -0,0 +1,53 @@
+# Admission of datagrams on an agent with many mobile nodes in vicinity
+# Usage: python bench/admission_bench.py [NODES]
+# An agent with one link gets NODES mobile nodes with addmobile. Times handle_packet() on a MSG packet from
+# the last mobile node added, in transit to the agent's neighbour, and on a packet from an unknown ID that
+# only the admission check sees. Sends go nowhere. Then times rmmobile of every mobile node, last added first.
+import sys, os, io, time, asyncio, contextlib
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from agent import Agent
+
+NODES = max(1, int(sys.argv[1])) if len(sys.argv) > 1 else 10000
+CALLS = 20000 # handle_packet() calls timed per packet
+AGENT_ID = 1
+NEIGHBOUR_ID = 2 # Linked to the agent, the packets are in transit to it
+FIRST_NODE = 1000 # Mobile nodes FIRST_NODE..
+
+class NullPort:
+    def sendto(self, dataBytes, dstID: int):
+        pass
+
+def per_call(router, packet: bytes, fromID: int) -> float: # Microseconds per handle_packet()
+    view = memoryview(bytearray(packet))
+    start = time.perf_counter()
+    for i in range(CALLS):
+        router.handle_packet(view, fromID)
+    return (time.perf_counter() - start) / CALLS * 1e6
+
+def main():
+    loop = asyncio.new_event_loop()
+    agent = Agent(AGENT_ID, loop, verbose=False)
+    agent.transport = NullPort()
+    nodeIDs = range(FIRST_NODE, FIRST_NODE + NODES)
+    with contextlib.redirect_stdout(io.StringIO()):
+        agent.add_link(NEIGHBOUR_ID, 1)
+        loop.run_until_complete(asyncio.sleep(0.5)) # Throttled SPF adds the route to the neighbour
+        start = time.perf_counter()
+        for id in nodeIDs:
+            agent.command("addmobile %d" % id)
+        addTime = time.perf_counter() - start
+    lastID = FIRST_NODE + NODES - 1
+    packet = ("%d,%d\nMSG\n" % (lastID, NEIGHBOUR_ID)).encode("utf-8") + b'x' * 64
+    print("%d mobile nodes: addmobile %.1f us each" % (NODES, addTime / NODES * 1e6))
+    print("handle_packet from a mobile node: %.2f us" % per_call(agent, packet, lastID))
+    print("handle_packet from an unknown ID: %.2f us" % per_call(agent, packet, FIRST_NODE + NODES))
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        for id in reversed(nodeIDs): # Last added first
+            agent.command("rmmobile %d" % id)
+        rmTime = time.perf_counter() - start
+    print("rmmobile %.1f us each" % (rmTime / NODES * 1e6))
+    loop.close()
+
+if __name__ == '__main__':
+    main()
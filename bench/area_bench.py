@@ -0,0 +1,126 @@
+# Areas against one flat area on the same domain
+# Usage: python bench/area_bench.py [AREAS ...]
+# Every area is 50 routers on a random graph. Its first two routers are its ABRs, linked to each other and
+# to an ABR of the next area in the backbone. The domain is simulated on sim.Fabric once flat, once with the
+# areas and once with stub areas, whose ABRs only summarise a default route into them. Each run counts the
+# datagrams sent until every router has a route to every other one, the LSAs and links in the LSDB of a
+# router inside an area, its full SPF time, and routes that loop or end early once the SPF runs held back at
+# convergence are done. The last lines compare the SPF of such a router in a domain of 10k routers, where
+# its area and the summary LSAs of its two ABRs are all it holds, with a flat SPF over the 10k routers, and
+# give the size of the largest LSA in the area's LSDB.
+import sys, os, time, random
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import wire
+from wire import LSA, Links
+from ospf import Routing, BACKBONE, DEFAULT_ID, SPF_MAX_HOLD, split_summary, summary_ID
+from sim import Fabric
+
+SIZES = [int(n) for n in sys.argv[1:]] or [5, 10]
+AREA_SIZE = 50
+LARGE = 10000 # Routers in the domain of the last line
+
+def make_links(areaCount: int) -> dict: # {(aID, bID): (cost, area ID)}, area k holds routers k*AREA_SIZE+1..
+    rng = random.Random(areaCount)
+    links = {}
+    def connect(aID: int, bID: int, cost: int, areaID: int):
+        if aID != bID and (aID, bID) not in links and (bID, aID) not in links:
+            links[(aID, bID)] = (cost, areaID)
+    for k in range(areaCount):
+        ids = list(range(k * AREA_SIZE + 1, (k + 1) * AREA_SIZE + 1))
+        connect(ids[0], ids[1], 1, BACKBONE) # ABRs of the area
+        connect(ids[0], (k + 1) % areaCount * AREA_SIZE + 2, rng.randint(1, 10), BACKBONE)
+        for i in range(1, AREA_SIZE): # Spanning tree plus random links
+            connect(ids[i], ids[rng.randrange(i)], rng.randint(1, 10), k + 1)
+        for i in range(AREA_SIZE // 2):
+            connect(*rng.sample(ids, 2), rng.randint(1, 10), k + 1)
+    return links
+
+def make_lsdb(links: dict) -> dict: # Flat LSDB {ID: LSA}
+    linkTables = {}
+    for (aID, bID), (cost, areaID) in links.items():
+        linkTables.setdefault(aID, {})[bID] = cost
+        linkTables.setdefault(bID, {})[aID] = cost
+    return {id: LSA(id, 1, Links(linkTable)) for id, linkTable in linkTables.items()}
+
+def bad_routes(fabric) -> int: # Pairs whose next hops loop or reach a router without a route
+    bad = 0
+    for dstID in fabric.routers:
+        state = {dstID: True} # {ID: reaches dstID}, None while on the current path
+        def reaches(id: int) -> bool:
+            if id in state:
+                return bool(state[id])
+            state[id] = None
+            route = fabric.routers[id].sysRT.get_route(dstID)
+            state[id] = route is not None and all(reaches(nbID) for nbID in route.nextHopIDs)
+            return state[id]
+        bad += sum(1 for id in fabric.routers if not reaches(id))
+    return bad
+
+def spf_time(selfID: int, lsdb: dict) -> float: # Best of 3 full SPF runs
+    times = []
+    for i in range(3):
+        routing = Routing(selfID, log=lambda message: None)
+        start = time.perf_counter()
+        routing.calc_spf(lsdb)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def run(areaCount: int, mode: str) -> str: # mode: "flat", "areas" or "stub"
+    links = make_links(areaCount)
+    fabric = Fabric()
+    for id in range(1, areaCount * AREA_SIZE + 1):
+        fabric.add_router(id)
+    for (aID, bID), (cost, areaID) in links.items():
+        fabric.connect(aID, bID, cost)
+        if mode != "flat" and areaID != BACKBONE:
+            fabric.routers[aID].set_area(areaID, [bID])
+            fabric.routers[bID].set_area(areaID, [aID])
+    if mode == "stub":
+        for k in range(areaCount):
+            for abrID in (k * AREA_SIZE + 1, k * AREA_SIZE + 2):
+                fabric.routers[abrID].set_stub(k + 1, True)
+    start = time.time()
+    simTime = fabric.run_until_converged(3600)
+    wallTime = time.time() - start
+    sent = fabric.sent
+    fabric.run_until(fabric.now + SPF_MAX_HOLD) # SPF runs held back at convergence are done before routes are checked
+    inside = fabric.routers[AREA_SIZE] # Last router of the first area
+    lsdb = inside.sysLSDB
+    return ("%4d routers %-5s converged in %4d s, %8d datagrams (%4.0f s wall), inside an area %5d LSAs %6d links,"
+            " full SPF %6.2f ms, %d bad routes"
+            % (len(fabric.routers), mode, simTime, sent, wallTime, len(lsdb),
+               sum(len(lsa.linkTable) for lsa in lsdb.values()), spf_time(inside.selfID, lsdb) * 1000,
+               bad_routes(fabric)))
+
+def main():
+    for areaCount in SIZES:
+        for mode in ("flat", "areas", "stub"):
+            print(run(areaCount, mode))
+
+    # Domain of LARGE routers, summary costs are the ABRs' flat costs
+    links = make_links(LARGE // AREA_SIZE)
+    lsdb = make_lsdb(links)
+    flatTime = spf_time(AREA_SIZE, lsdb)
+    for stub in (False, True):
+        areaLSDB = {}
+        linkTables = {}
+        for id in range(1, AREA_SIZE + 1): # Router LSAs of the first area as its members advertise them
+            linkTables[id] = {nbID: cost for nbID, cost in lsdb[id].linkTable.items()
+                              if links.get((id, nbID), links.get((nbID, id)))[1] == 1}
+        for abrID in (1, 2):
+            routing = Routing(abrID, log=lambda message: None)
+            routing.calc_spf(lsdb)
+            routes = sorted((dstID, route.cost) for dstID, route in routing.table.items() if dstID > AREA_SIZE)
+            for part, summary in enumerate(split_summary(abrID, [(DEFAULT_ID, 0)] if stub else routes)):
+                linkTables[abrID][summary_ID(abrID, part)] = 0
+                areaLSDB[summary_ID(abrID, part)] = LSA(summary_ID(abrID, part), 1, Links(summary))
+        for id, linkTable in linkTables.items():
+            areaLSDB[id] = LSA(id, 1, Links(linkTable))
+        print("%d routers: inside a%s area %d LSAs %d links (largest %d bytes), full SPF %.2f ms; flat %d LSAs %d"
+              " links, full SPF %.2f ms"
+              % (len(lsdb), " stub" if stub else "n", len(areaLSDB), sum(len(lsa.linkTable) for lsa in areaLSDB.values()),
+                 max(wire.entry_size("LSU", lsa) for lsa in areaLSDB.values()), spf_time(AREA_SIZE, areaLSDB) * 1000,
+                 len(lsdb), sum(len(lsa.linkTable) for lsa in lsdb.values()), flatTime * 1000))
+
+if __name__ == '__main__':
+    main()
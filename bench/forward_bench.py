@@ -0,0 +1,99 @@
+# Data packets per second through a chain of routers over UDP
+# Usage: python bench/forward_bench.py [ROUTERS] [SECONDS] [WINDOW]
+# The routers run in this process on one event loop, each on its own socket, linked in a chain. A sender
+# socket linked to the first router and a sink socket linked to the last one have no LSA and count as
+# stubs. Once the first router has a route to the sink, the sender keeps WINDOW MSG packets in flight and
+# the sink counts the ones that arrive for SECONDS. Every packet is forwarded by every router of the chain.
+# Then times handle_packet() of the first router alone on the same packet, with sends going nowhere.
+import sys, os, time, asyncio, socket
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from ospf import Router, UDPTransport, UDP_IP, PORT_BASE
+
+ROUTERS = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+SECONDS = float(sys.argv[2]) if len(sys.argv) > 2 else 5
+SRC_ID = 200 # Sender, the routers follow it and the sink comes last
+WINDOW = int(sys.argv[3]) if len(sys.argv) > 3 else 32 # Packets in flight
+CALLS = 200000 # handle_packet() calls timed
+PAYLOAD = 64 # Bytes of message per packet
+
+def open_socket(id: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setblocking(False)
+    sock.bind((UDP_IP, PORT_BASE + id))
+    return sock
+
+async def main():
+    loop = asyncio.get_running_loop()
+    sinkID = SRC_ID + ROUTERS + 1
+    chain = list(range(SRC_ID, sinkID + 1))
+    routers = [Router(id, loop, verbose=False) for id in chain[1:-1]]
+    for router in routers:
+        UDPTransport(router, loop)
+    for i, router in enumerate(routers, 1):
+        router.add_link(chain[i - 1], 1)
+        router.add_link(chain[i + 1], 1)
+    src = open_socket(SRC_ID)
+    sink = open_socket(sinkID)
+    start = time.time()
+    while sinkID not in routers[0].sysRT.table:
+        await asyncio.sleep(0.1)
+    print("%d routers converged in %.1f s" % (ROUTERS, time.time() - start))
+
+    header = ("%d,%d\nMSG\n" % (SRC_ID, sinkID)).encode("utf-8")
+    packet = header + b'x' * PAYLOAD
+    firstHop = (UDP_IP, PORT_BASE + chain[1])
+    count = {"sent": 0, "received": 0}
+    def send():
+        while count["sent"] - count["received"] < WINDOW:
+            try:
+                src.sendto(packet, firstHop)
+            except BlockingIOError:
+                return
+            count["sent"] += 1
+    def drain(sock): # HELLOs to the stubs are read and dropped
+        while True:
+            try:
+                data = sock.recv(65535)
+            except BlockingIOError:
+                break
+            if sock is sink and data.startswith(header):
+                count["received"] += 1
+        send()
+    loop.add_reader(src.fileno(), drain, src)
+    loop.add_reader(sink.fileno(), drain, sink)
+    send()
+    async def refill(): # Packets lost on a full socket are sent again
+        last = None
+        while True:
+            await asyncio.sleep(0.05)
+            if count["received"] == last:
+                count["sent"] = count["received"]
+                send()
+            last = count["received"]
+    refiller = asyncio.ensure_future(refill())
+    await asyncio.sleep(0.5) # Warm up
+    first = count["received"]
+    await asyncio.sleep(SECONDS)
+    packets = count["received"] - first
+    refiller.cancel()
+    print("%d routers: %.0f packets/s through the chain, %.0f forwarded/s"
+          % (ROUTERS, packets / SECONDS, packets * ROUTERS / SECONDS))
+    for sock in (src, sink):
+        loop.remove_reader(sock.fileno())
+        sock.close()
+    for router in routers:
+        router.transport.close()
+
+    class NullPort:
+        def sendto(self, dataBytes, dstID: int):
+            pass
+    router = routers[0]
+    router.transport = NullPort()
+    view = memoryview(bytearray(packet))
+    start = time.perf_counter()
+    for i in range(CALLS):
+        router.handle_packet(view, SRC_ID)
+    print("handle_packet: %.2f us per packet" % ((time.perf_counter() - start) / CALLS * 1e6))
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,56 @@
+# Memory of the LSDB, the SPF state and the neighbour table per entry
+# Usage: python bench/lsdb_memory.py [LSAS] [LINKS]
+# A router with no neighbours installs LSAS LSAs of LINKS links each (every router linked to the ones
+# next to it on a ring and to routers further away, the first one also to the router), runs SPF over them
+# and builds 10000 neighbours.
+# tracemalloc counts the bytes still held after each step.
+import sys, os, time, tracemalloc
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import wire
+from sim import Fabric
+
+LSA_COUNT = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+LINK_COUNT = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+BATCH = 1000 # LSAs per LSU
+NEIGHBOURS = 10000
+
+def make_lsu(firstID: int, lastID: int) -> list:
+    lines = []
+    for id in range(firstID, lastID):
+        links = []
+        for j in range(LINK_COUNT):
+            step = (1, -1, 317, -317, 1009, -1009)[j % 6] * (j // 6 + 1)
+            links.append(str((id - 2 + step) % LSA_COUNT + 2) + ':' + str(j % 10 + 1))
+        if id == 2: # Link back to the router, SPF only uses links both ends advertise
+            links.append("1:1")
+        lines.append(str(id) + ",1," + ';'.join(links))
+    return wire.parse_LSU('\n'.join(lines))
+
+def main():
+    fabric = Fabric()
+    router = fabric.add_router(1, minLSArrival=0)
+    router.add_link(2, 1)
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    for firstID in range(2, LSA_COUNT + 2, BATCH):
+        router.update_sysLSDB(make_lsu(firstID, min(firstID + BATCH, LSA_COUNT + 2)))
+    lsdbBytes = tracemalloc.get_traced_memory()[0] - base
+
+    base = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    fabric.run_until(fabric.now + 1) # Throttled SPF runs
+    spfTime = time.perf_counter() - start
+    spfBytes = tracemalloc.get_traced_memory()[0] - base
+
+    base = tracemalloc.get_traced_memory()[0]
+    nbTable = {id: router.Neighbour() for id in range(NEIGHBOURS)}
+    nbBytes = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+
+    print("%d LSAs x %d links, %d routes" % (len(router.sysLSDB), LINK_COUNT, len(router.sysRT.table)))
+    print("LSDB:       %7.1f MB %6.0f bytes per LSA" % (lsdbBytes / 2**20, lsdbBytes / LSA_COUNT))
+    print("SPF state:  %7.1f MB %6.0f bytes per route (%.1f s)" % (spfBytes / 2**20, spfBytes / LSA_COUNT, spfTime))
+    print("Neighbours: %7.1f MB %6.0f bytes per neighbour" % (nbBytes / 2**20, nbBytes / len(nbTable)))
+
+if __name__ == '__main__':
+    main()
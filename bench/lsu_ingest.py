@@ -0,0 +1,32 @@
+# Microbenchmark: LSU ingest rate of update_sysLSDB
+# Usage: python bench/lsu_ingest.py [ROUNDS]
+# A router with no neighbours installs LSUs for a whole LSDB again and again, every round carrying
+# a newer sequence number for every LSA so each one is installed. LSUs are parsed before the clock
+# starts, so only the install path is timed (SPF is throttled and never gets to run).
+import sys, os, time
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import wire
+from ospf import Router
+from sim import Fabric
+
+ROUNDS = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+LSDBS = ((1000, 10), (100, 100), (10, 1000)) # (LSAs, links per LSA), 10k links each
+
+def make_lsu(lsaCount: int, linkCount: int, seq: int) -> list:
+    text = '\n'.join(str(id) + ',' + str(seq) + ',' + ';'.join(str(id + j) + ":1" for j in range(1, linkCount + 1))
+                     for id in range(2, lsaCount + 2))
+    return wire.parse_LSU(text)
+
+def main():
+    for lsaCount, linkCount in LSDBS:
+        router = Router(1, Fabric(), verbose=False, minLSArrival=0)
+        lsus = [make_lsu(lsaCount, linkCount, seq) for seq in range(1, ROUNDS + 1)]
+        start = time.perf_counter()
+        for lsu in lsus:
+            router.update_sysLSDB(lsu)
+        elapsed = time.perf_counter() - start
+        print("%5d LSAs x %4d links: %9.0f LSAs/s %11.0f links/s"
+              % (lsaCount, linkCount, lsaCount * ROUNDS / elapsed, lsaCount * linkCount * ROUNDS / elapsed))
+
+if __name__ == '__main__':
+    main()
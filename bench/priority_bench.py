@@ -0,0 +1,77 @@
+# Convergence of a new adjacency while a router forwards a data flood
+# Usage: python bench/priority_bench.py [RATE] [SENDERS ...]
+# Router A forwards MSG packets from sender stubs to a sink stub nobody reads. Each sender is a process
+# sending RATE packets/s through A, paced so that A keeps the CPU time it needs when the senders share its
+# cores, the flood comes from elsewhere on a real network. Once the flood runs, a link to router B is added on
+# both routers and the time until A has a route to B and B a route to the sink is measured: HELLO, DBD, LSR
+# and LSU all cross A's socket during the flood. Runs once for each number of senders, 0 runs without flood.
+import sys, os, time, asyncio, multiprocessing
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import batchio
+from ospf import Router, UDPTransport, UDP_IP, PORT_BASE, READ_BATCH, open_socket
+
+RATE = int(sys.argv[1]) if len(sys.argv) > 1 else 60000
+SENDERS = [int(n) for n in sys.argv[2:]] or [0, 2]
+A_ID = 500
+B_ID = 501
+SINK_ID = 502 # Senders follow it
+FLOOD_TIME = 1 # Seconds of flood before the link is added
+TIMEOUT = 60 # Seconds given to converge
+PAYLOAD = 64 # Bytes of message per packet
+
+def sender(id: int, stop):
+    sock = open_socket(id)
+    batch = batchio.Batch(sock, UDP_IP, READ_BATCH, 2048)
+    packet = ("%d,%d\nMSG\n" % (id, SINK_ID)).encode("utf-8") + b'x' * PAYLOAD
+    packets = [(packet, PORT_BASE + A_ID)] * READ_BATCH
+    nextTime = time.time()
+    while not stop.is_set():
+        batch.send(packets)
+        nextTime += READ_BATCH / RATE
+        delay = nextTime - time.time()
+        if delay > 0:
+            time.sleep(delay)
+    sock.close()
+
+async def run(senders: int) -> str:
+    loop = asyncio.get_running_loop()
+    a = Router(A_ID, loop, verbose=False)
+    b = Router(B_ID, loop, verbose=False)
+    for router in (a, b):
+        UDPTransport(router, loop)
+    sink = open_socket(SINK_ID)
+    senderIDs = range(SINK_ID + 1, SINK_ID + 1 + senders)
+    for id in [SINK_ID, *senderIDs]:
+        a.add_link(id, 1)
+    while SINK_ID not in a.sysRT.table:
+        await asyncio.sleep(0.1)
+
+    context = multiprocessing.get_context("spawn")
+    stop = context.Event()
+    procs = [context.Process(target=sender, args=(id, stop)) for id in senderIDs]
+    for proc in procs:
+        proc.start()
+    await asyncio.sleep(FLOOD_TIME)
+    dropped = a.stats.get("dataDropped", 0)
+    start = time.time()
+    a.add_link(B_ID, 1)
+    b.add_link(A_ID, 1)
+    while (B_ID not in a.sysRT.table or SINK_ID not in b.sysRT.table) and time.time() - start < TIMEOUT:
+        await asyncio.sleep(0.01)
+    convergeTime = time.time() - start
+    dropped = a.stats.get("dataDropped", 0) - dropped
+    stop.set()
+    for proc in procs:
+        proc.join()
+    for router in (a, b):
+        router.transport.close()
+    sink.close()
+    return ("%d senders at %d packets/s: converged in %.2f s%s, %d data packets dropped by A meanwhile"
+            % (senders, RATE, convergeTime, "" if convergeTime < TIMEOUT else " (timed out)", dropped))
+
+def main():
+    for senders in SENDERS:
+        print(asyncio.run(run(senders)))
+
+if __name__ == '__main__':
+    main()
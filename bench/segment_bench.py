@@ -0,0 +1,42 @@
+# Control traffic on a full mesh with and without a broadcast segment
+# Usage: python bench/segment_bench.py [ROUTERS ...]
+# Every router links to every other one. Point to point, each router synchronises its LSDB with every
+# neighbour and floods every LSA to all of them. On one segment only the DR and BDR become adjacent to
+# everyone and LSAs go through the DR. Counts the datagrams sent until every router has every LSA and
+# route, and then per second over 60 quiet seconds, where the refreshes of every LSA are flooded.
+import sys, os, time
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from sim import Fabric
+
+SIZES = [int(n) for n in sys.argv[1:]] or [10, 20, 40]
+SEGMENT = 1
+
+def run(n: int, segment: bool) -> tuple: # (simulated seconds, datagrams to converge, datagrams per second after)
+    fabric = Fabric()
+    ids = list(range(1, n + 1))
+    for id in ids:
+        fabric.add_router(id)
+    for i, aID in enumerate(ids):
+        for bID in ids[i + 1:]:
+            fabric.connect(aID, bID)
+    if segment:
+        for id in ids:
+            fabric.routers[id].join_segment(SEGMENT, [nbID for nbID in ids if nbID != id])
+    start = fabric.now
+    while not all(len(router.sysLSDB) == n for router in fabric.routers.values()) or not fabric.converged():
+        fabric.step()
+    simTime = fabric.now - start
+    converged = fabric.sent
+    fabric.run_until(fabric.now + 60)
+    return simTime, converged, (fabric.sent - converged) / 60
+
+def main():
+    for n in SIZES:
+        for segment in (False, True):
+            start = time.time()
+            simTime, converged, steady = run(n, segment)
+            print("%4d routers %-14s converged in %3d s, %8d datagrams, %8.0f datagrams/s after (%.1f s wall)"
+                  % (n, "segment" if segment else "point to point", simTime, converged, steady, time.time() - start))
+
+if __name__ == '__main__':
+    main()
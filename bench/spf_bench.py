@@ -0,0 +1,65 @@
+# SPF time and memory on large graphs
+# Usage: python bench/spf_bench.py [NODES ...]
+# Every router links to 3 random routers in both directions (costs 1-10) and to the next router at cost 50.
+# Counts the bytes the Routing state keeps with tracemalloc, then times one full SPF, the LSDB arriving
+# in LSUs of 1000 LSAs with an incremental SPF after each, and 50 single link cost changes.
+import sys, os, time, random, tracemalloc
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from wire import LSA, Links
+from ospf import Routing
+
+SIZES = [int(n) for n in sys.argv[1:]] or [10000, 50000]
+CHANGES = 50
+
+def make_lsdb(n: int) -> dict: # {ID: LSA}
+    rng = random.Random(n)
+    links = {id: {} for id in range(1, n + 1)}
+    for id in range(1, n + 1):
+        for nbID in rng.sample(range(1, n + 1), 3):
+            if nbID != id:
+                links[id][nbID] = links[nbID][id] = rng.randint(1, 10)
+        if id < n:
+            links[id][id + 1] = links[id + 1][id] = 50
+    return {id: LSA(id, 1, Links(linkTable)) for id, linkTable in links.items()}
+
+def main():
+    for n in SIZES:
+        lsdb = make_lsdb(n)
+        tracemalloc.start()
+        routing = Routing(1, log=lambda message: None)
+        routing.calc_spf(lsdb)
+        spfBytes = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        routing = Routing(1, log=lambda message: None)
+        start = time.perf_counter()
+        routing.calc_spf(lsdb)
+        fullTime = time.perf_counter() - start
+
+        # LSDB arriving from a neighbour in LSUs of 1000 LSAs, SPF after each
+        routing = Routing(1, log=lambda message: None)
+        ids = list(lsdb)
+        partial = {1: lsdb[1]}
+        routing.calc_spf(partial)
+        syncTime = 0
+        for i in range(0, n, 1000):
+            partial.update((id, lsdb[id]) for id in ids[i:i + 1000])
+            start = time.perf_counter()
+            routing.calc_spf(partial, ids[i:i + 1000])
+            syncTime += time.perf_counter() - start
+
+        rng = random.Random(1)
+        incTime = 0
+        for i in range(CHANGES): # New instance of one LSA with one link cost changed
+            id = rng.randrange(1, n + 1)
+            linkTable = dict(lsdb[id].linkTable)
+            nbID = rng.choice(list(linkTable))
+            linkTable[nbID] = rng.randint(1, 60)
+            lsdb[id] = LSA(id, lsdb[id].seq + 1, Links(linkTable))
+            start = time.perf_counter()
+            routing.calc_spf(lsdb, [id])
+            incTime += time.perf_counter() - start
+        print("%6d routers: full SPF %5.2f s, LSDB sync %5.2f s, one link change %5.2f ms, %6.1f MB (%4.0f B per router)"
+              % (n, fullTime, syncTime, incTime / CHANGES * 1000, spfBytes / 2**20, spfBytes / n))
+
+if __name__ == '__main__':
+    main()
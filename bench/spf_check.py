@@ -0,0 +1,68 @@
+# Randomized check of incremental SPF against a full run
+# Usage: python bench/spf_check.py [TOPOLOGIES] [CHANGES] [SEED]
+# Every topology is a small random LSDB with zero-cost links, links only one end advertises and IDs that
+# have no LSA. CHANGES times, one to three routers get a new LSA instance: a link added, removed or given
+# another cost (0 included), the same links again (a refresh), or the LSA removed. One Routing follows the
+# changes with calc_spf(lsdb, changedIDs), and its table must match a fresh Routing's full calc_spf(lsdb).
+import sys, os, random
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from wire import LSA, Links
+from ospf import Routing
+
+TOPOLOGIES = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+CHANGES = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+SEED = int(sys.argv[3]) if len(sys.argv) > 3 else 1
+COSTS = (0, 0, 1, 1, 2, 3, 5, 8) # Zero-cost links make equal-cost paths and ties common
+
+def random_links(rng, id: int, n: int) -> dict: # {ID: Cost}, IDs up to n + 2 have no LSA
+    return {nbID: rng.choice(COSTS) for nbID in rng.sample(range(1, n + 3), rng.randint(0, 4)) if nbID != id}
+
+def change(rng, lsdb: dict, id: int, n: int): # New instance of the LSA of id, or its removal
+    lsa = lsdb.get(id)
+    linkTable = dict(lsa.linkTable) if lsa else {}
+    seq = lsa.seq + 1 if lsa else 1
+    kind = rng.random()
+    if kind < 0.15 and id != 1: # The router itself always has its LSA
+        lsdb.pop(id, None)
+        return
+    if kind < 0.3: # Refresh
+        pass
+    elif kind < 0.5 or not linkTable: # Link added
+        nbID = rng.randint(1, n + 2)
+        if nbID != id:
+            linkTable[nbID] = rng.choice(COSTS)
+    elif kind < 0.7: # Link removed
+        del linkTable[rng.choice(list(linkTable))]
+    elif kind < 0.9: # Cost changed
+        linkTable[rng.choice(list(linkTable))] = rng.choice(COSTS)
+    else: # All links replaced
+        linkTable = random_links(rng, id, n)
+    lsdb[id] = LSA(id, seq, Links(linkTable))
+
+def main():
+    rng = random.Random(SEED)
+    failures = 0
+    for topology in range(TOPOLOGIES):
+        n = rng.randint(2, 25)
+        lsdb = {id: LSA(id, 1, Links(random_links(rng, id, n))) for id in range(1, n + 1) if id == 1 or rng.random() < 0.9}
+        routing = Routing(1, log=lambda message: None)
+        routing.calc_spf(lsdb)
+        for step in range(CHANGES):
+            changedIDs = [rng.randint(1, n) for i in range(rng.randint(1, 3))]
+            for id in changedIDs:
+                change(rng, lsdb, id, n)
+            routing.calc_spf(lsdb, changedIDs)
+            full = Routing(1, log=lambda message: None)
+            full.calc_spf(lsdb)
+            if routing.table != full.table:
+                failures += 1
+                if failures <= 3:
+                    print("Topology %d step %d, changed %s" % (topology, step, changedIDs))
+                    print("  incremental:", dict(sorted(routing.table.items())))
+                    print("  full:       ", dict(sorted(full.table.items())))
+                routing = full # Go on from the right tree
+    print("%d topologies x %d changes, %d tables differ" % (TOPOLOGIES, CHANGES, failures))
+    print("PASS" if not failures else "FAIL")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+# Stress test: flood LSUs at one router from many fake neighbours
+# Usage: python bench/stress_lsu.py [ROUTER SCRIPT] [NEIGHBOURS] [LSU PER NEIGHBOUR]
+# Every neighbour floods from its own thread while the router is also asked to print its LSDB,
+# so packet handling, timers and commands interleave on the router's event loop. Checks router CPU
+# time while flooding and while idle against wall time, a loop that spins instead of waiting takes
+# the whole core, then checks the LSDB holds the last sequence number sent by every neighbour
+import sys, os, socket, subprocess, time
+from threading import Thread
+
+SCRIPT = sys.argv[1] if len(sys.argv) > 1 else "ospf.py"
+NB_COUNT = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+LSU_COUNT = int(sys.argv[3]) if len(sys.argv) > 3 else 200
+ROUTER_ID = 1
+UDP_IP = "127.0.0.1"
+PORT_BASE = 10000
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+IDLE_TIME = 3 # Seconds the router is left idle
+IDLE_CPU_MAX = 0.05 # Largest share of wall time the router may use while idle
+FLOOD_CPU_MAX = 0.5 # Largest share of wall time the router may use while flooded, including the drain
+
+def cpu_time(pid) -> float: # user + system seconds from /proc
+    with open("/proc/" + str(pid) + "/stat") as f:
+        fields = f.read().rsplit(')', 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+def send_lsa(nbID: int, seq: int, sock):
+    data = str(nbID) + ',' + str(ROUTER_ID) + "\nLSU\n" + str(nbID) + ',' + str(seq) + ',' + str(ROUTER_ID) + ":1"
+    sock.sendto(data.encode("utf-8"), (UDP_IP, PORT_BASE + ROUTER_ID))
+
+def flood(nbID: int, sock):
+    for seq in range(1, LSU_COUNT + 1):
+        send_lsa(nbID, seq, sock)
+        if seq % 10 == 0:
+            time.sleep(0.01) # Stay below the socket buffer, dropped datagrams are not what is measured
+
+def main():
+    router = subprocess.Popen([sys.executable, SCRIPT, str(ROUTER_ID)], cwd=ROOT, text=True,
+                              stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    output = []
+    reader = Thread(target=lambda: output.extend(router.stdout), daemon=True)
+    reader.start()
+    nbIDs = range(ROUTER_ID + 1, ROUTER_ID + 1 + NB_COUNT)
+    socks = {}
+    for nbID in nbIDs:
+        socks[nbID] = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        socks[nbID].bind((UDP_IP, PORT_BASE + nbID))
+        router.stdin.write("addlink " + str(nbID) + " 1\n")
+    router.stdin.flush()
+    time.sleep(1)
+
+    start = time.time()
+    cpuStart = cpu_time(router.pid)
+    threads = [Thread(target=flood, args=(nbID, socks[nbID])) for nbID in nbIDs]
+    for t in threads:
+        t.start()
+    while any(t.is_alive() for t in threads):
+        router.stdin.write("lsdb\n") # Readers contend with the flood
+        router.stdin.flush()
+        time.sleep(0.05)
+    time.sleep(2) # Let the router drain its socket
+    for nbID in nbIDs: # Resend the last LSA in case its datagram was dropped
+        send_lsa(nbID, LSU_COUNT, socks[nbID])
+    time.sleep(1)
+    floodCPU = cpu_time(router.pid) - cpuStart
+    floodWall = time.time() - start
+
+    cpuStart = cpu_time(router.pid)
+    time.sleep(IDLE_TIME)
+    idleCPU = cpu_time(router.pid) - cpuStart
+
+    output.clear()
+    router.stdin.write("lsdb\nexit\n")
+    router.stdin.flush()
+    router.wait(timeout=10)
+    reader.join(timeout=2)
+    lsdb = {}
+    for line in output:
+        parts = line.split(' ', 2)
+        if len(parts) == 3 and parts[0].isdigit() and parts[1].isdigit():
+            lsdb[int(parts[0])] = int(parts[1])
+    missing = [nbID for nbID in nbIDs if nbID not in lsdb]
+    stale = [nbID for nbID in nbIDs if nbID in lsdb and lsdb[nbID] != LSU_COUNT]
+
+    print("LSUs sent:", NB_COUNT * LSU_COUNT, "from", NB_COUNT, "neighbours")
+    busy = [] # Phases whose CPU time is over their bound
+    if floodCPU > FLOOD_CPU_MAX * floodWall:
+        busy.append("flooding")
+    if idleCPU > IDLE_CPU_MAX * IDLE_TIME:
+        busy.append("idle")
+    print("Router CPU while flooding: %.2f s over %.2f s (at most %.0f%%)" % (floodCPU, floodWall, FLOOD_CPU_MAX * 100))
+    print("Router CPU while idle:     %.2f s over %.2f s (at most %.0f%%)" % (idleCPU, IDLE_TIME, IDLE_CPU_MAX * 100))
+    print("LSDB entries:", len(lsdb), "missing:", missing, "stale:", stale, "CPU over bound:", busy)
+    print("PASS" if not missing and not stale and not busy else "FAIL")
+    if missing or stale:
+        print("".join(output[-20:]))
+
+if __name__ == '__main__':
+    main()
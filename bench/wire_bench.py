@@ -0,0 +1,38 @@
+# Encode/decode throughput and size of text vs binary control packets
+# Usage: python bench/wire_bench.py
+import os, sys, random, timeit
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import wire
+
+LINKS_PER_LSA = 4
+
+def make_lsdb(n: int) -> dict: # {ID: LSA}
+    random.seed(n)
+    return {id: wire.LSA(id, random.randint(1, 10000), wire.Links({random.randrange(n): random.randint(1, 100) for i in range(LINKS_PER_LSA)}))
+            for id in range(1, n + 1)}
+
+def rate(func, count: int) -> float: # Calls per second
+    loops, total = timeit.Timer(func).autorange()
+    return loops / total * count
+
+def main():
+    print("%-6s %6s %5s %10s %14s %14s" % ("pkt", "LSAs", "fmt", "bytes", "encode LSA/s", "decode LSA/s"))
+    for n in (10, 1000, 10000):
+        lsdb = make_lsdb(n)
+        payloads = {"DBD": (1, 0, 1, {id: lsa.seq for id, lsa in lsdb.items()}), "LSU": list(lsdb.values())}
+        for pktType, payload in payloads.items():
+            text = wire.TEXT[pktType](payload).encode("utf-8")
+            binary = wire.PACK[pktType](payload)
+            rows = (
+                ("text", len(text),
+                 rate(lambda: wire.TEXT[pktType](payload).encode("utf-8"), n),
+                 rate(lambda: wire.PARSE[pktType](text.decode("utf-8")), n)),
+                ("bin", len(binary),
+                 rate(lambda: wire.PACK[pktType](payload), n),
+                 rate(lambda: wire.UNPACK[pktType](binary), n)),
+            )
+            for fmt, size, enc, dec in rows:
+                print("%-6s %6d %5s %10d %14.0f %14.0f" % (pktType, n, fmt, size, enc, dec))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+# Data packets per second forwarded by one router with worker processes
+# Usage: python bench/worker_bench.py [SECONDS] [WORKERS ...]
+# One router is linked to SENDERS sender stubs and a sink stub. Each sender is a process sending MSG packets
+# to the sink through the router as fast as its socket takes them, and the sink is a process counting the
+# ones that arrive for SECONDS. The router runs once for each worker count, 0 forwards on its own socket.
+# SO_REUSEPORT spreads the senders over the sockets on the port, so the rate only grows with workers when
+# there is a core for each worker and sender.
+import sys, os, time, asyncio, select, multiprocessing
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import batchio
+from ospf import Router, UDPTransport, UDP_IP, PORT_BASE, READ_BATCH, open_socket
+
+SECONDS = float(sys.argv[1]) if len(sys.argv) > 1 else 5
+WORKERS = [int(n) for n in sys.argv[2:]] or [0, 1, 2, 4]
+ROUTER_ID = 300
+SENDERS = 4 # Sender stubs ROUTER_ID+1.., the sink follows them
+WARMUP = 1 # Seconds before the sink starts counting
+PAYLOAD = 64 # Bytes of message per packet
+
+def header(srcID: int, sinkID: int) -> bytes:
+    return ("%d,%d\nMSG\n" % (srcID, sinkID)).encode("utf-8")
+
+def sender(id: int, sinkID: int, seconds: float):
+    sock = open_socket(id)
+    batch = batchio.Batch(sock, UDP_IP, READ_BATCH, 2048)
+    packets = [(header(id, sinkID) + b'x' * PAYLOAD, PORT_BASE + ROUTER_ID)] * READ_BATCH
+    end = time.time() + seconds
+    while time.time() < end:
+        if not batch.send(packets): # Socket full
+            select.select([], [sock], [], 0.01)
+    sock.close()
+
+def sink(id: int, seconds: float, conn):
+    sock = open_socket(id)
+    batch = batchio.Batch(sock, UDP_IP, READ_BATCH, 2048)
+    start = time.time() + WARMUP
+    end = start + seconds
+    count = 0
+    while time.time() < end:
+        if not select.select([sock], [], [], 0.1)[0]:
+            continue
+        now = time.time()
+        for data, port in batch.recv():
+            if now >= start and bytes(data[-PAYLOAD - 4:-PAYLOAD]) == b"MSG\n":
+                count += 1
+    conn.send(count)
+    sock.close()
+
+async def run(workers: int) -> float: # Packets per second that reach the sink
+    loop = asyncio.get_running_loop()
+    sinkID = ROUTER_ID + SENDERS + 1
+    router = Router(ROUTER_ID, loop, verbose=False)
+    transport = UDPTransport(router, loop)
+    for id in range(ROUTER_ID + 1, sinkID + 1):
+        router.add_link(id, 1)
+    transport.set_workers(workers)
+    while sinkID not in router.sysRT.table:
+        await asyncio.sleep(0.1)
+    await asyncio.sleep(0.5) # Workers up with a snapshot holding the route
+
+    context = multiprocessing.get_context("spawn")
+    recvConn, sendConn = context.Pipe(duplex=False)
+    procs = [context.Process(target=sink, args=(sinkID, SECONDS, sendConn))]
+    procs += [context.Process(target=sender, args=(id, sinkID, WARMUP + SECONDS)) for id in range(ROUTER_ID + 1, sinkID)]
+    for proc in procs:
+        proc.start()
+    while not recvConn.poll():
+        await asyncio.sleep(0.1)
+    count = recvConn.recv()
+    for proc in procs:
+        proc.join()
+    transport.close()
+    return count / SECONDS
+
+def main():
+    for workers in WORKERS:
+        rate = asyncio.run(run(workers))
+        print("%d workers, %d senders: %.0f packets/s forwarded" % (workers, SENDERS, rate))
+
+if __name__ == '__main__':
+    main()
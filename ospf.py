@@ -1,386 +1,1425 @@
-import sys, random, socket, time, copy
-from threading import Thread
+import sys, os, re, random, time, heapq, asyncio, socket
+from collections import deque
+from array import array
+from itertools import repeat
+from functools import partial
+from typing import NamedTuple
+import wire, batchio
+from wire import LSA, Links
 debug = 0
 
-# Command line arguments
-n = len(sys.argv)
-if n > 1:
-    SELF_ID = int(sys.argv[1])
-else:
-    print("Router ID not given, generating random ID")
-    SELF_ID = random.randint(1, 99)
-print("Router ID:", SELF_ID)
-
-# Socket
 UDP_IP = "127.0.0.1"
 PORT_BASE = 10000
-UDP_PORT = PORT_BASE + SELF_ID
-sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-sock.bind((UDP_IP, UDP_PORT))
+STATES = ("Down", "Init", "TwoWay", "Exchange", "Full") # Neighbour states, TwoWay: heard each other on a segment, no adjacency
+MAX_PACKET = 1024 # Largest DBD/LSR/LSU datagram sent, larger tables are split over several packets
+MAX_DATAGRAM = 65507 # Largest UDP payload, an LSA that does not fit is never sent
+MAX_DBD_ENTRIES = 100000 # Bound on the DBD reassembled per neighbour
+DATA_TYPES = (b"MSG", b"TUN", b"AGENT") # Packets forwarded without parsing their payload
+ADDR_PEEK = 40 # Bytes holding "srcID,dstID\nTYPE\n" of any data packet
+DATA_HEAD = re.compile(rb"([^,\n]*),([^\n]*)\n(?:" + b'|'.join(DATA_TYPES) + rb")\n") # srcID, dstID, matched in place
+READ_BATCH = 32 # Datagrams read per recvmmsg() and sent per sendmmsg()
+DRAIN_BATCHES = 8 # recvmmsg() calls per wakeup, reads the control packets waiting behind data
+DATA_BATCH = 64 # Data packets handled per wakeup once every control packet read is handled
+DATA_QUEUE_LEN = 1024 # Data packets held for later wakeups, default per router
+HELLO_INTERVAL = 1 # Seconds between HELLOs to a neighbour that is not Full yet
+ACK_DELAY = 1 # Seconds acks are held back so several LSAs share one packet
+RXMT_INTERVAL = 5 # Seconds before an unacknowledged LSA or unanswered DBD is sent again
+LS_REFRESH_TIME = 15 # Seconds before the self LSA is originated again, default per router
+LSA_MAX_AGE = 30 # Seconds an LSA is kept without being refreshed, default per router
+DEAD_INTERVAL = 30 # Seconds of silence before a neighbour is declared Down, default per router
+REFRESH_JITTER = 0.25 # Each refresh comes up to this fraction of the interval early, routers drift apart
+MIN_LS_INTERVAL = 2 # Seconds between originations of the self LSA, changes in between are merged
+MIN_LS_ARRIVAL = 1 # Seconds before a newer instance of an LSA is accepted again, must not exceed MIN_LS_INTERVAL
+SPF_DELAY = 0.05 # Seconds from the first change to SPF, later changes in between share the run
+SPF_HOLD = 0.2 # Seconds between SPF runs at first, doubles while changes keep coming
+SPF_MAX_HOLD = 2 # Largest hold between SPF runs, a quiet period this long resets the hold
+BACKBONE = 0 # Area of links not given one with "area"
+SUMMARY_IDS = 1024 # Summary LSA IDs per ABR, part k of ABR a has ID -(a * SUMMARY_IDS + k), int32 holds ABR IDs below 2**21
+SUMMARY_LINKS = (MAX_PACKET - wire.HEADER_ROOM - 40) // 20 # Destinations per summary LSA, "ID:cost;" takes up to 20 bytes
+DEFAULT_ID = 0 # Destination of the default route the ABRs of a stub area summarise the rest of the domain with, router IDs start at 1
+
+def print_with_time(message: str):
+    curTime = time.strftime("%H:%M:%S", time.localtime())
+    print(curTime, "-", message)
+
+def summary_ID(abrID: int, part: int) -> int: # LSA ID of part of an ABR's summary
+    return -(abrID * SUMMARY_IDS + part)
+
+def summary_ABR(id: int) -> int: # ABR that originates summary LSA id
+    return -id // SUMMARY_IDS
+
+def split_summary(abrID: int, routes, parts: int=1) -> list: # [{dstID: cost}] for each summary LSA of an ABR
+    # routes: [(dstID, cost)] sorted by ID. At least parts parts, each links back to the ABR at cost 0 and holds
+    # up to SUMMARY_LINKS destinations, more once SUMMARY_IDS parts are full.
+    size = max(SUMMARY_LINKS, -(-len(routes) // SUMMARY_IDS))
+    parts = max(parts, -(-len(routes) // size), 1)
+    summary = []
+    for part in range(parts):
+        links = {abrID: 0}
+        links.update(routes[part * size:(part + 1) * size])
+        summary.append(links)
+    return summary
+
+# Transport
+def peek_data(data) -> tuple: # (srcID, dstID) from the address header of a data packet, None for anything else
+    if wire.is_binary(data):
+        return None
+    head = DATA_HEAD.match(data, 0, ADDR_PEEK)
+    if head is None:
+        return None
+    try:
+        return int(head[1]), int(head[2])
+    except ValueError: # Weird address, the full parser reports it
+        return None
+
+def is_data(data) -> bool: # MSG/TUN/AGENT packet, anything else goes first as control
+    if wire.is_binary(data):
+        return False
+    return DATA_HEAD.match(data, 0, ADDR_PEEK) is not None
+
+def open_socket(id: int, reusePort: bool=False) -> socket.socket: # Non-blocking UDP socket on PORT_BASE + id
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    if reusePort: # Shared with worker processes, every socket on the port must set it before bind
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.setblocking(False)
+    sock.bind((UDP_IP, PORT_BASE + id))
+    return sock
+
+class UDPTransport: # Router socket on PORT_BASE + ID, read and written in batches of up to READ_BATCH
+    # Each wakeup drains the socket with up to DRAIN_BATCHES recvmmsg() calls into a control and a data
+    # queue, handles every control packet, then up to DATA_BATCH data packets, and comes back on the next
+    # loop iteration while data is left. A data flood thus never holds HELLOs and LSUs back in the socket,
+    # where the kernel would drop them along with the data. While no data waits, the data packets of a
+    # recvmmsg() are handled in their receive slots right after the control packets read so far, and only
+    # data left waiting is copied out. Data beyond the router's dataQueueLen is dropped and counted in its
+    # stats. Sends are queued and go out together with one sendmmsg() once the wakeup is done, or on the
+    # next loop iteration when sent from a timer or command.
+    # With "workers", worker processes share the port and forward data themselves (see workers.py).
+    def __init__(self, router, loop):
+        self.router = router
+        self.loop = loop
+        self.sock = open_socket(router.selfID)
+        self.outbox = [] # [(dataBytes, port)] not sent yet
+        self.flushing = False # Flush scheduled on the loop
+        self.workers = None # WorkerPool forwarding data, None without workers
+        self.control = [] # [(dataBytes, fromID)] read this wakeup
+        self.data = deque() # [(dataBytes, fromID)] waiting, up to router.dataQueueLen
+        self.serving = False # read_ready() scheduled for the data left
+        self.set_recv_size(router.recvBufSize)
+        loop.add_reader(self.sock.fileno(), self.read_ready)
+        router.transport = self
+
+    def read_ready(self): # Timers and stdin get their turn between wakeups
+        self.serving = False
+        backlog = bool(self.data)
+        inline = 0 if backlog else DATA_BATCH # Data handled in its receive slot, none while older data waits
+        for i in range(DRAIN_BATCHES):
+            received = self.batch.recv()
+            inline = self.queue_packets([(data, port - PORT_BASE) for data, port in received], inline)
+            if len(received) < READ_BATCH: # Socket drained
+                break
+        self.handle_queued(DATA_BATCH if backlog else inline)
+
+    def queue_packets(self, packets, inline: int=0) -> int: # [(data, fromID)], return inline left
+        # Up to inline data packets are handled at once, after the control packets queued so far, and sent
+        # before their receive slots are read into again. The rest is copied out of the slots.
+        control, data = self.control, self.data
+        router = self.router
+        now = []
+        for packet, fromID in packets:
+            if not is_data(packet):
+                control.append((bytes(packet), fromID))
+            elif len(now) < inline:
+                now.append((packet, fromID))
+            elif len(data) < router.dataQueueLen:
+                data.append((bytes(packet), fromID))
+            else:
+                router.stats["dataDropped"] += 1
+        if now:
+            self.handle_control()
+            handle_packet = router.handle_packet
+            for packet, fromID in now:
+                handle_packet(packet, fromID)
+            self.flush()
+        return inline - len(now)
+
+    def handle_control(self):
+        handle_packet = self.router.handle_packet
+        control, self.control = self.control, []
+        for packet, fromID in control:
+            handle_packet(packet, fromID)
+
+    def handle_queued(self, dataBatch: int=DATA_BATCH): # Control packets, then up to dataBatch queued data packets
+        self.handle_control()
+        handle_packet = self.router.handle_packet
+        data = self.data
+        for i in range(min(dataBatch, len(data))):
+            packet, fromID = data.popleft()
+            handle_packet(packet, fromID)
+        self.flush()
+        if data and not self.serving:
+            self.serving = True
+            self.loop.call_soon(self.read_ready)
+
+    def sendto(self, dataBytes, dstID: int): # Datagrams the socket cannot take at flush are dropped
+        self.outbox.append((dataBytes, PORT_BASE + dstID))
+        if not self.flushing:
+            self.flushing = True
+            self.loop.call_soon(self.flush)
+
+    def flush(self):
+        self.flushing = False
+        if self.outbox:
+            outbox, self.outbox = self.outbox, []
+            self.batch.send(outbox)
+
+    def set_recv_size(self, size: int): # Longer datagrams are cut to size
+        self.batch = batchio.Batch(self.sock, UDP_IP, READ_BATCH, size)
+        if self.workers is not None: # Workers read with the new size too
+            self.set_workers(self.workers.count)
+
+    def set_workers(self, count: int): # Forward data in count worker processes, 0 stops them
+        if self.workers is not None:
+            self.workers.close()
+            self.workers = None
+        if count <= 0:
+            return
+        if not self.sock.getsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT): # Bind again to share the port
+            self.flush()
+            self.loop.remove_reader(self.sock.fileno())
+            self.sock.close()
+            self.sock = open_socket(self.router.selfID, reusePort=True)
+            self.batch = batchio.Batch(self.sock, UDP_IP, READ_BATCH, self.router.recvBufSize)
+            self.loop.add_reader(self.sock.fileno(), self.read_ready)
+        import workers
+        self.workers = workers.WorkerPool(self, count)
+
+    def publish_fib(self): # Routes or admission changed
+        if self.workers is not None:
+            self.workers.publish()
+
+    def close(self):
+        self.flush()
+        if self.workers is not None:
+            self.workers.close()
+        self.loop.remove_reader(self.sock.fileno())
+        self.sock.close()
+
+async def read_lines(loop): # Lines from stdin without blocking the loop
+    reader = asyncio.StreamReader()
+    try:
+        await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+    except ValueError: # Regular file, not a pipe or terminal
+        while True:
+            line = await loop.run_in_executor(None, sys.stdin.readline)
+            if not line:
+                return
+            yield line
+    while True:
+        line = await reader.readline()
+        if not line:
+            return
+        yield line.decode("utf-8")
+
+class ExpiryHeap: # Deadlines of many keys behind one loop timer, only deadlines that pass cost anything
+    def __init__(self, loop, expire):
+        self.loop = loop
+        self.expire = expire # Called with the key of each deadline that passes
+        self.heap = [] # (when, key), an entry whose deadline moved later is pushed again when it pops
+        self.due = {} # Current deadline {key: when}
+        self.timer = None # Loop timer for the earliest entry
+        self.timerTime = None
+
+    def set(self, key, when: float): # Add or move the deadline of key
+        oldWhen = self.due.get(key)
+        self.due[key] = when
+        if oldWhen is None or when < oldWhen: # Moving later needs no push
+            heapq.heappush(self.heap, (when, key))
+            self.__arm()
+
+    def discard(self, key):
+        self.due.pop(key, None)
+
+    def __arm(self):
+        when = self.heap[0][0]
+        if self.timer is not None:
+            if self.timerTime <= when:
+                return
+            self.timer.cancel()
+        self.timer = self.loop.call_at(when, self.__fire)
+        self.timerTime = when
+
+    def __fire(self):
+        self.timer = None
+        heap = self.heap
+        due = self.due
+        curTime = self.loop.time()
+        while heap and heap[0][0] <= curTime:
+            when, key = heapq.heappop(heap)
+            if key not in due or due[key] < when: # Discarded, or an earlier entry already expired it
+                continue
+            if due[key] > when: # Moved later
+                heapq.heappush(heap, (due[key], key))
+                continue
+            del due[key]
+            self.expire(key)
+        if heap:
+            self.__arm()
 
 # Data
 class Neighbour:
+    __slots__ = ("state", "lastDBD", "binary", "rxDDSeq", "rxDBD", "rxFrags", "retransList", "ackList",
+                 "lastDBDTime", "helloTimer", "ackTimer", "rxmtTimer", "priority", "dr", "bdr")
+
     def __init__(self):
         self.state = "Down"
-        self.lastDBD = {}
+        self.lastDBD = None # Last whole DBD received
+        self.binary = False # Neighbour announced binary control packets in HELLO
+        self.rxDDSeq = None # DD sequence number of the DBD being reassembled
+        self.rxDBD = None # Fragments of that DBD received so far {ID: Seq}, None when not reassembling
+        self.rxFrags = None # Fragment indexes received so far
+        self.retransList = {} # LSAs sent but not yet acknowledged {ID: (Seq, lastSentTime)}
+        self.ackList = {} # LSAs received and waiting for a delayed ack {ID: Seq}
+        self.lastDBDTime = 0 # When a DBD was last sent
+        self.helloTimer = None # Pending HELLO, None once Full
+        self.ackTimer = None # Pending flush of ackList
+        self.rxmtTimer = None # Pending check of retransList
+        # Last announced in HELLO on a broadcast segment
+        self.priority = 0
+        self.dr = None
+        self.bdr = None
+
+class Segment: # Broadcast segment shared with some neighbours, only the DR and BDR become adjacent to everyone
+    __slots__ = ("members", "dr", "bdr")
 
-class Routing:
     def __init__(self):
-        self.table = {} # Routing table {dstID: [nextHopID, cost]}
+        self.members = set() # Neighbour IDs on the segment
+        self.dr = None # Designated router ID, None before the first election
+        self.bdr = None # Backup designated router ID
 
-    def get_next_hop(self, dstID: int) -> int:
-        if dstID not in self.table:
-            return None
-        else:
-            return self.table[dstID][0]
-
-    def calc_spf(self, lsdb):
-        nodes = {SELF_ID: [None, 0]} # {ID: [prvNode, cost]}
-        visited = []
-        unvisited = [SELF_ID]
-        self.__dijkstra(SELF_ID, nodes, visited, unvisited, lsdb)
-        # print("nodes:", nodes)
-        # print("visited:", visited)
-        # print("unvisited:", unvisited)
-        visitedNodes = [[i, nodes[i]] for i in visited]
-        for dstID, node in visitedNodes: # Update routing table
-            if dstID == SELF_ID:
-                continue
-            cost = node[1]
-            nxtHopID = self.__calc_next_hop(nodes, dstID) # Calc next hop
-            if dstID not in self.table: # New route
-                print_with_time("add route " + str(dstID) + ' ' + str(nxtHopID) + ' ' + str(cost))
-            elif self.table[dstID] != [nxtHopID, cost]: # Route changed
-                print_with_time("update route " + str(dstID) + ' ' + str(nxtHopID) + ' ' + str(cost))
-            self.table[dstID] = [nxtHopID, cost]
-        idDel = []
-        for id in self.table: # Find broken routes
-            if id not in nodes:
-                idDel.append(id)
-        for id in idDel:
-            del self.table[id]
-            print_with_time("remove route " + str(dstID))
-        # print(self.table)
+class Area: # Link state of one area, a router keeps one for each area it has links in
+    __slots__ = ("lsdb", "rt", "summary")
+
+    def __init__(self, lsdb, rt):
+        self.lsdb = lsdb # Router LSAs of the area and summary LSAs of its ABRs {ID: LSA}
+        self.rt = rt # Routing over lsdb
+        self.summary = None # Links of each part of our summary in this area [{dstID: cost}], None unless we are an ABR
+
+class Route(NamedTuple): # Routing table entry
+    nextHopIDs: tuple # Equal-cost next hops, sorted
+    cost: int
+
+class Adjacency: # Link tables as compressed sparse rows, row i holds the links of the router with index i
+    # Row i is nbrs/costs[start[i]:start[i] + length[i]] with room for capacity[i] links. A row that
+    # outgrows its room moves to the end of the arrays, the space it leaves is reclaimed once half of
+    # the arrays are unused.
+    def __init__(self):
+        self.start = array("i")
+        self.length = array("i")
+        self.capacity = array("i")
+        self.nbrs = array("i") # Index of the router at the other end of each link
+        self.costs = array("i")
+        self.garbage = 0 # Entries left behind by rows that moved
+
+    def build(self, rows): # Replace all rows, rows: [(nbrs, costs)] in index order
+        self.__init__()
+        start, length, nbrs, costs = self.start, self.length, self.nbrs, self.costs
+        for rowNbrs, rowCosts in rows:
+            s = len(nbrs)
+            start.append(s)
+            nbrs.extend(rowNbrs)
+            costs.extend(rowCosts)
+            length.append(len(nbrs) - s)
+        self.capacity = array("i", length)
+
+    def add_row(self): # Empty row for a new index
+        self.start.append(len(self.nbrs))
+        self.length.append(0)
+        self.capacity.append(0)
+
+    def row(self, i: int) -> tuple: # (nbrs, costs) of row i
+        s = self.start[i]
+        e = s + self.length[i]
+        return self.nbrs[s:e], self.costs[s:e]
 
-    def __dijkstra(self, curID, nodes, visited, unvisited, lsdb):
+    def set_row(self, i: int, rowNbrs, rowCosts):
+        n = len(rowNbrs)
+        if n > self.capacity[i]:
+            self.__move(i, n)
+        s = self.start[i]
+        self.nbrs[s:s + n] = array("i", rowNbrs)
+        self.costs[s:s + n] = array("i", rowCosts)
+        self.length[i] = n
+
+    def set_entry(self, i: int, nb: int, cost: int): # Add or update the link of row i to nb
+        s = self.start[i]
+        n = self.length[i]
         try:
-            curNode = lsdb[curID]
-        except KeyError: # No such key
+            self.costs[self.nbrs.index(nb, s, s + n)] = cost
+            return
+        except ValueError:
             pass
-        else: # Only perform if neighbour LSA in LSDB
-            for id, cost in curNode[2].items(): # linkTable
-                if id in nodes:
-                    if nodes[curID][1] + cost < nodes[id][1]: # If current path cost cheaper than previous path
-                        nodes[id] = [curID, nodes[curID][1] + cost]
-                else:
-                    unvisited.append(id)
-                    nodes[id] = [curID, nodes[curID][1] + cost]
-        visited.append(curID)
+        if n == self.capacity[i]:
+            self.__move(i, max(4, 2 * n))
+            s = self.start[i]
+        self.nbrs[s + n] = nb
+        self.costs[s + n] = cost
+        self.length[i] = n + 1
+
+    def remove_entry(self, i: int, nb: int): # Remove the link of row i to nb, the last link takes its place
+        s = self.start[i]
+        n = self.length[i]
         try:
-            unvisited.remove(curID)
+            j = self.nbrs.index(nb, s, s + n)
         except ValueError:
-            pass
-        if not unvisited: # Visited all nodes
             return
-        closestID = self.__closest_ID(nodes, unvisited)
-        self.__dijkstra(closestID, nodes, visited, unvisited, lsdb)
+        last = s + n - 1
+        self.nbrs[j] = self.nbrs[last]
+        self.costs[j] = self.costs[last]
+        self.length[i] = n - 1
+
+    def __move(self, i: int, capacity: int): # Move row i to the end of the arrays with room for capacity links
+        s = self.start[i]
+        n = self.length[i]
+        self.garbage += self.capacity[i]
+        self.start[i] = len(self.nbrs)
+        self.capacity[i] = capacity
+        padding = array("i", bytes(4 * (capacity - n)))
+        self.nbrs += self.nbrs[s:s + n] + padding
+        self.costs += self.costs[s:s + n] + padding
+        if self.garbage > len(self.nbrs) // 2:
+            self.__compact()
+
+    def __compact(self): # Rows keep their room
+        nbrs, costs = array("i"), array("i")
+        for i in range(len(self.start)):
+            s = self.start[i]
+            e = s + self.capacity[i]
+            self.start[i] = len(nbrs)
+            nbrs += self.nbrs[s:e]
+            costs += self.costs[s:e]
+        self.nbrs, self.costs = nbrs, costs
+        self.garbage = 0
 
-    def __closest_ID(self, nodes, unvisited):
-        nodeList = [[i, nodes[i]] for i in unvisited]
-        nodeList.sort(key=lambda x: x[1][1]) # Sort by cost
-        if not nodeList:
+class Routing:
+    # SPF over router indexes: every router ID in the LSDB or in a link table gets an index, the links
+    # both ends advertise (or to routers without an LSA) are kept in Adjacency rows and the shortest-path
+    # DAG in lists by index. A link only one end still advertises is left out as soon as the other LSA
+    # arrives, the rows are updated for the LSAs that changed. Indexes of routers that left the LSDB are
+    # reclaimed on the next full run. A summary LSA (negative ID, see summary_ID()) is a node its ABR links
+    # to at cost 0, with links to some of the destinations the ABR reaches outside the area.
+    def __init__(self, selfID: int, log=print_with_time, summaries: bool=True):
+        self.selfID = selfID
+        self.log = log # Route changes are reported here
+        self.summaries = summaries # Use summary LSAs, ABRs only do in the backbone
+        self.table = {} # Routing table {dstID: Route}
+        self.index = {} # {ID: index}, self is index 0
+        self.ids = [] # ID of each index
+        self.links = Adjacency() # Two-way links used by last run
+        self.inLinks = Adjacency() # Reverse link tables
+        # Shortest-path DAG of last run
+        self.cost = [] # Cost from self, None when not reached
+        self.prvs = [] # Equal-cost predecessors (tuple)
+        self.hops = [] # Next hop IDs from self (frozenset), shared with a predecessor until an equal-cost path adds to it
+        self.children = [] # DAG successors (list), None when there are none
+
+    def get_route(self, dstID: int) -> Route: # Route to dstID, else the default route, None without either
+        route = self.table.get(dstID)
+        if route is None:
+            route = self.table.get(DEFAULT_ID)
+        return route
+
+    def get_next_hop(self, dstID: int, srcID: int=None, senderID: int=None) -> int:
+        route = self.get_route(dstID)
+        if route is None:
             return None
+        nextHopIDs = route.nextHopIDs
+        if senderID in nextHopIDs and len(nextHopIDs) > 1: # Avoid return to sender
+            nextHopIDs = tuple(id for id in nextHopIDs if id != senderID)
+        # Hash flow (srcID, dstID) so packets of a flow stay on one of the equal-cost paths
+        return nextHopIDs[hash((srcID, dstID)) % len(nextHopIDs)]
+
+    def calc_spf(self, lsdb, changedIDs=None):
+        # changedIDs: IDs of LSAs installed/removed since last run, None for a full run
+        # A removed LSA turns the links to it into stub links, found only by a full run
+        if changedIDs is None or not self.ids or not all(id in lsdb for id in changedIDs):
+            self.__full_spf(lsdb)
+            changed = {id for id, cost in zip(self.ids, self.cost) if cost is not None} | set(self.table)
         else:
-            return nodeList[0][0]
-
-    def __calc_next_hop(self, nodes, dstID):
-        curID = dstID
-        prevID = nodes[dstID][0]
-        while prevID != SELF_ID: # Backtrack to self -> nextHop
-            curID = prevID
-            prevID = nodes[curID][0]
-        return curID
-
-
-nbTable = {} # Neighbour table {ID: Neighbour}
-linkTable = {} # Link table {ID: Cost}
-sysLSA = [SELF_ID, 0, linkTable, int(time.time())] # [ID, Seq, linkTable, lastUpdateTime]
-sysLSDB = {SELF_ID: sysLSA} # Collection of LSA from routers including self {ID: LSA}
-sysDBD = {} # {ID, Seq}
-sysRT = Routing() 
-STATES = ("Down", "Init", "Exchange", "Full") # Neighbour states
-
-# Mutual exclusion lock for tables
-lsdbLock = 0
-dbdLock = 0
-
-##### Neighbour table #####
-def set_nb(id: int, state: str):
-    global nbTable
-    global linkTable
-    id = int(id)
-    if state not in STATES:
-        print("Invalid state:", state)
-        return
-    if id not in linkTable:
-        return
-    elif id not in nbTable:
-        nbTable[id] = Neighbour()
-    elif nbTable[id].state != state:
-        print_with_time("update neighbor state " + str(id) + ' ' + state)
-        nbTable[id].state = state
-
-def remove_nb(nbID: int):
-    global nbTable
-    nbID = int(nbID)
-    if nbID not in nbTable:
-        return
-    del nbTable[nbID]
-    print_with_time("remove neighbor " + str(nbID))
-
-##### Links #####
-def set_link(id: int, cost: int):
-    global sysLSA
-    id = int(id)
-    cost = int(cost)
-    if id not in linkTable:
-        print("Link not found")
-        return
-    print_with_time("update neighbour " + str(id) + ' ' + str(cost))
-    # Update link cost in LSA
-    sysLSA[1] += 1
-    sysLSA[2][id] = cost
-    sysLSA[3] = int(time.time())
-    print_with_time("update LSA " + str(SELF_ID) + ' ' + str(sysLSA[1]))
-    # Flood updated LSA
-    lsu = [sysLSA]
-    send_LSU(lsu, "flood")
-    attempt_calc_spf()
-    
-def add_link(id: int, cost: int):
-    global sysLSA
-    id = int(id)
-    cost = int(cost)
-    if id in linkTable:
-        print("Link already exists")
-        return
-    # Add link cost
-    sysLSA[2][id] = cost
-    # Add to neighbour table
-    set_nb(id, "Down")
-    print_with_time("add neighbour " + str(id) + ' ' + str(cost))
-    # Add link cost in LSA
-    sysLSA[1] += 1
-    sysLSA[3] = int(time.time())
-    print_with_time("update LSA " + str(SELF_ID) + ' ' + str(sysLSA[1]))
-    # Flood updated LSA
-    lsu = [sysLSA]
-    send_LSU(lsu, "flood")
-    attempt_calc_spf()
-
-def remove_link(id):
-    global sysLSA
-    remove_nb(id)
-    if id not in sysLSA[2]:
-        print("Link not found")
-        return
-    del sysLSA[2][id]
-    sysLSA[1] += 1
-    sysLSA[3] = int(time.time())
-    print_with_time("update LSA " + str(SELF_ID) + ' ' + str(sysLSA[1]))
-    # Flood updated LSA
-    lsu = [sysLSA]
-    send_LSU(lsu, "flood")
-    attempt_calc_spf()
-
-##### HELLO #####
-def send_HELLO(id: int):
-    id = int(id)
-    message = "HELLO\n"
-    if nbTable[id].state == "Down":
-        message += "init"
-    else:
-        message += "received"
-    send_to_id_noRT(message, SELF_ID, id)
-
-##### DBD ######
-def update_nb_DBD(id: int, DBD):
-    global nbTable
-    id = int(id)
-    if id not in nbTable:
-        print("Neighbour not found for DBD")
-        return
-    nbTable[id].lastDBD = copy.deepcopy(DBD)
-
-def update_sysDBD(): # sysDBD is only updated here with reference to sysLSDB
-    global sysLSDB
-    global sysDBD
-    global dbdLock
-    while dbdLock: # mutex
-        continue
-    dbdLock = 1 # mutex lock
-    sysDBD.clear()
-    for id, lsa in sysLSDB.items():
+            changed = {self.ids[i] for i in self.__incremental_spf(lsdb, changedIDs)}
+            if not changed: # Link tables unchanged (e.g. LSA refresh)
+                return
+        hopTuples = {} # Next hops shared by many routes are sorted once
+        for dstID in changed: # Update routing table
+            if dstID == self.selfID or dstID < 0: # Summary LSAs are no destination
+                continue
+            i = self.index.get(dstID)
+            if i is None or self.cost[i] is None: # Broken route
+                self.set_route(dstID, None)
+                continue
+            hopIDs = self.hops[i] # Next hops carried forward by SPF
+            nextHopIDs = hopTuples.get(hopIDs)
+            if nextHopIDs is None:
+                nextHopIDs = hopTuples[hopIDs] = tuple(sorted(hopIDs))
+            self.set_route(dstID, Route(nextHopIDs, self.cost[i]))
+        # print(self.table)
+
+    def set_route(self, dstID: int, route: Route): # Log and apply a route change, None removes the route
+        oldRoute = self.table.get(dstID)
+        if route is None:
+            if oldRoute is not None: # Broken route
+                del self.table[dstID]
+                self.log("remove route " + str(dstID))
+            return
+        strHops = ','.join(str(id) for id in route.nextHopIDs)
+        if oldRoute is None: # New route
+            self.log("add route " + str(dstID) + ' ' + strHops + ' ' + str(route.cost))
+        elif oldRoute != route: # Route changed
+            self.log("update route " + str(dstID) + ' ' + strHops + ' ' + str(route.cost))
+        self.table[dstID] = route
+
+    def __index_of(self, id: int) -> int: # New IDs get the next index
+        i = self.index.get(id)
+        if i is None:
+            i = self.index[id] = len(self.ids)
+            self.ids.append(id)
+            self.cost.append(None)
+            self.prvs.append(None)
+            self.hops.append(None)
+            self.children.append(None)
+            self.links.add_row()
+            self.inLinks.add_row()
+        return i
+
+    def __full_spf(self, lsdb):
+        newIDs = set(lsdb).union(*(lsa.linkTable for lsa in lsdb.values())) # Linked routers may have no LSA
+        newIDs.discard(self.selfID)
+        self.ids = ids = [self.selfID] + sorted(newIDs)
+        self.index = index = dict(zip(ids, range(len(ids))))
+        n = len(ids)
+        self.links.build((list(twoWay), twoWay.values()) for twoWay in map(partial(self.__two_way_links, lsdb), ids))
+        start, length, nbrs, costs = self.links.start, self.links.length, self.links.nbrs, self.links.costs
+        inNbrs = [[] for i in range(n)]
+        inCosts = [[] for i in range(n)]
+        for i in range(n):
+            s = start[i]
+            e = s + length[i]
+            for j, cost in zip(nbrs[s:e], costs[s:e]):
+                inNbrs[j].append(i)
+                inCosts[j].append(cost)
+        self.inLinks.build(zip(inNbrs, inCosts))
+        self.cost = [None] * n
+        self.prvs = [None] * n
+        self.hops = [None] * n
+        self.children = [None] * n
+        self.cost[0] = 0
+        self.prvs[0] = ()
+        self.hops[0] = frozenset()
+        selfNbrs, selfCosts = self.links.row(0)
+        self.__dijkstra([(0, j, cost) for j, cost in zip(selfNbrs, selfCosts)], None)
+
+    def __incremental_spf(self, lsdb, changedIDs) -> set:
+        # Only re-settle the part of the DAG whose cost or next hops can change, return indexes whose route changed
+        cost, prvs, hops, children = self.cost, self.prvs, self.hops, self.children
+        links, inLinks = self.links, self.inLinks
+        roots = [] # Nodes reached over a link that got more expensive or removed
+        seeds = [] # Links that got cheaper or added (srcIndex, dstIndex, cost)
+        for id in set(changedIDs):
+            i = self.__index_of(id)
+            oldLinks = dict(zip(*links.row(i)))
+            newLinks = self.__two_way_links(lsdb, id)
+            if newLinks != oldLinks:
+                self.__set_links(i, oldLinks, newLinks, roots, seeds)
+            backLinks = {j for j in newLinks if self.ids[j] in lsdb} # Stubs have no links back
+            for j in backLinks.symmetric_difference(inLinks.row(i)[0]): # Link back became or stopped being two-way
+                oldBack = dict(zip(*links.row(j)))
+                newBack = dict(oldBack)
+                if j in backLinks:
+                    newBack[i] = lsdb[self.ids[j]].linkTable[id]
+                else:
+                    newBack.pop(i, None)
+                self.__set_links(j, oldBack, newBack, roots, seeds)
+        if not roots and not seeds:
+            return set()
+        # Detach everything reached through the worsened links
+        detached = self.__descendants(roots)
+        oldRoutes = {} # Route before this run {index: (cost, hopIDs)}
+        for i in detached:
+            oldRoutes[i] = (cost[i], hops[i])
+            for p in prvs[i]:
+                if p not in detached:
+                    children[p].remove(i)
+        for i in detached:
+            cost[i] = prvs[i] = hops[i] = children[i] = None
+        relaxLinks = seeds
+        for i in detached: # Reattach through links from the rest of the DAG
+            inNbrs, inCosts = inLinks.row(i)
+            relaxLinks += [(j, i, linkCost) for j, linkCost in zip(inNbrs, inCosts)]
+        self.__dijkstra(relaxLinks, oldRoutes)
+        changed = set()
+        for i, route in oldRoutes.items():
+            newRoute = (cost[i], hops[i]) if cost[i] is not None else None
+            if route != newRoute:
+                changed.add(i)
+        return changed
+
+    def __two_way_links(self, lsdb, id: int) -> dict: # {index: cost} of the links SPF may use
+        # Both ends advertise the link, or the other end has no LSA (a stub such as a mobile client).
+        # Summary LSAs are left out when not used, and our own one is no path for us.
+        lsa = lsdb.get(id)
+        selfID = self.selfID
+        summaries = self.summaries
+        if lsa is None or id < 0 and (not summaries or summary_ABR(id) == selfID):
+            return {}
+        return {self.__index_of(nbID): linkCost for nbID, linkCost in lsa.linkTable.items()
+                if (nbID not in lsdb or id in lsdb[nbID].linkTable) and (nbID >= 0 or summaries and summary_ABR(nbID) != selfID)}
+
+    def __set_links(self, i: int, oldLinks: dict, newLinks: dict, roots: list, seeds: list):
+        # Replace row i, nodes reached over a worse or removed link go to roots, better or added links to seeds
+        cost, prvs, inLinks = self.cost, self.prvs, self.inLinks
+        self.links.set_row(i, list(newLinks), list(newLinks.values()))
+        for j, linkCost in oldLinks.items():
+            if j not in newLinks:
+                inLinks.remove_entry(j, i)
+            if j not in newLinks or newLinks[j] > linkCost:
+                if cost[j] is not None and i in prvs[j]:
+                    roots.append(j)
+        for j, linkCost in newLinks.items():
+            if j not in oldLinks or linkCost != oldLinks[j]:
+                inLinks.set_entry(j, i, linkCost)
+            if j not in oldLinks or linkCost < oldLinks[j]:
+                seeds.append((i, j, linkCost))
+
+    def __descendants(self, roots) -> set:
+        children = self.children
+        found = set()
+        stack = list(roots)
+        while stack:
+            i = stack.pop()
+            if i in found:
+                continue
+            found.add(i)
+            stack.extend(children[i] or ())
+        return found
+
+    def __dijkstra(self, relaxLinks, oldRoutes):
+        # Iterative Dijkstra with a binary heap, stale heap entries are skipped (lazy deletion)
+        # A node keeps every equal-cost predecessor and the union of their next hops. A node whose
+        # next hops grow after it was expanded (zero-cost links) is queued again to pass them on.
+        # relaxLinks: links (srcIndex, dstIndex, cost) to relax first, every node already reached is settled
+        # oldRoutes: collects the route of every touched node before this run, None on a full run
+        cost, prvs, hops, children, ids = self.cost, self.prvs, self.hops, self.children, self.ids
+        start, length, nbrs, costs = self.links.start, self.links.length, self.links.nbrs, self.links.costs
+        heap = [] # (cost, index)
+        pending = set() # Nodes queued for expansion
+        edges = relaxLinks
+        while True:
+            for srcIdx, dstIdx, linkCost in edges: # Relax, the self node is index 0
+                srcCost = cost[srcIdx]
+                if srcCost is None or dstIdx == 0:
+                    continue
+                newCost = srcCost + linkCost
+                hopIDs = hops[srcIdx] if srcIdx else frozenset((ids[dstIdx],))
+                dstCost = cost[dstIdx]
+                if oldRoutes is not None and dstIdx not in oldRoutes: # Remember route before this run
+                    oldRoutes[dstIdx] = (dstCost, hops[dstIdx]) if dstCost is not None else None
+                if dstCost is None or newCost < dstCost: # Cheaper path, replaces previous paths
+                    if dstCost is not None:
+                        for prvIdx in prvs[dstIdx]:
+                            children[prvIdx].remove(dstIdx)
+                    cost[dstIdx] = newCost
+                    prvs[dstIdx] = (srcIdx,)
+                    hops[dstIdx] = hopIDs
+                    if children[srcIdx] is None:
+                        children[srcIdx] = [dstIdx]
+                    else:
+                        children[srcIdx].append(dstIdx)
+                    if length[dstIdx]: # Nodes without links (stubs, summary destinations) have nothing to expand
+                        heapq.heappush(heap, (newCost, dstIdx))
+                        pending.add(dstIdx)
+                elif newCost == dstCost: # Equal-cost path
+                    if srcIdx not in prvs[dstIdx]:
+                        prvs[dstIdx] += (srcIdx,)
+                        if children[srcIdx] is None:
+                            children[srcIdx] = [dstIdx]
+                        else:
+                            children[srcIdx].append(dstIdx)
+                    if not hopIDs <= hops[dstIdx]:
+                        hops[dstIdx] = hops[dstIdx] | hopIDs
+                        if dstIdx not in pending and length[dstIdx]:
+                            heapq.heappush(heap, (newCost, dstIdx))
+                            pending.add(dstIdx)
+            # Expand the next node
+            while heap:
+                curCost, curIdx = heapq.heappop(heap)
+                if curIdx in pending and cost[curIdx] == curCost:
+                    break
+            else:
+                return
+            pending.discard(curIdx)
+            s = start[curIdx]
+            e = s + length[curIdx]
+            edges = zip(repeat(curIdx), nbrs[s:e], costs[s:e])
+
+
+class Router:
+    # A router owns its tables and talks to the network through transport.sendto(dataBytes, dstID).
+    # Everything runs on one event loop: received datagrams go to handle_packet(), operator commands to
+    # command(), and HELLO, ack and retransmission run as timers from loop.call_later(). LSA refresh, LSA
+    # aging and neighbour dead intervals share one ExpiryHeap, so one loop timer covers the whole LSDB.
+    # serve() binds the UDP port and reads commands from stdin, sim.py passes a simulated loop instead.
+    Neighbour = Neighbour # Class of nbTable entries
+
+    def __init__(self, selfID: int, loop, transport=None, verbose=True, traceEvents=True,
+                 refreshInterval=LS_REFRESH_TIME, maxAge=LSA_MAX_AGE, deadInterval=DEAD_INTERVAL,
+                 minLSInterval=MIN_LS_INTERVAL, minLSArrival=MIN_LS_ARRIVAL,
+                 spfDelay=SPF_DELAY, spfHold=SPF_HOLD, spfMaxHold=SPF_MAX_HOLD):
+        self.selfID = selfID
+        self.loop = loop # asyncio loop or anything with time(), call_at() and call_later()
+        self.clock = loop.time
+        self.transport = transport
+        self.verbose = verbose # Print timestamped events
+        self.traceEvents = traceEvents # Also print neighbour state, LSA and route changes
+        self.nbTable = {} # Neighbour table {ID: Neighbour}
+        self.linkTable = {} # Link table {ID: Cost}
+        self.admitted = set() # IDs datagrams are accepted from, kept by update_admitted() from admits()
+        self.segments = {} # Broadcast segments {segment ID: Segment}, set with "segment"
+        self.segmentOf = {} # Segment of each neighbour on one {ID: segment ID}
+        self.priority = 1 # DR election priority, 0 never becomes DR or BDR
+        # LSAs are never changed once built, so the LSDB, SPF and retransmission lists all share them.
+        # The self LSA is replaced on origination.
+        self.sysLSA = LSA(selfID, 0, Links(), self.clock()) # All links, on an ABR each area holds an instance with the links in it
+        self.sysLSDB = {selfID: self.sysLSA} # LSDB of the first area (the backbone unless no link is in it) {ID: LSA}
+        self.sysDBD = {} # {ID, Seq}
+        self.sysRT = Routing(selfID, self.print_event) # Routes used to forward, merged over the areas on an ABR
+        self.areaOf = {} # Area of links outside the backbone {ID: area ID}, set with "area"
+        self.stubAreas = set() # Areas we only summarise a default route into as their ABR, set with "stub"
+        self.areas = {BACKBONE: Area(self.sysLSDB, self.sysRT)} # {area ID: Area}
+        self.binaryWire = False # Send binary DBD/LSR/LSU to neighbours that announce it, toggle with "wire"
+        self.recvBufSize = 65535 # Largest datagram read, set with "bufsize"
+        self.dataQueueLen = DATA_QUEUE_LEN # Data packets held while control packets go first, set with "dataqueue"
+        self.ddSeq = 0 # DD sequence number of the last DBD sent
+        self.refreshInterval = refreshInterval # Seconds between originations of the self LSA, set with "timers"
+        self.maxAge = maxAge # Seconds before an LSA that was not refreshed is removed
+        self.deadInterval = deadInterval # Seconds without a packet before a neighbour goes Down
+        self.minLSInterval = minLSInterval # Seconds between originations of the self LSA
+        self.minLSArrival = minLSArrival # Seconds between accepted instances of one LSA
+        self.stats = { # Flooding counters, shown with "stats"
+            "originated": 0, # Self LSA instances flooded
+            "originateMerged": 0, # Link changes held back by minLSInterval and sent with a later instance
+            "installed": 0, # Newer LSAs from neighbours installed and flooded on
+            "arrivalDropped": 0, # Newer LSAs dropped by minLSArrival, the sender retransmits them
+            "spfTriggers": 0, # LSDB changes asking for SPF
+            "spfRuns": 0, # SPF computations, the rest of the triggers were merged into these
+            "dataDropped": 0, # Data packets dropped on a full data queue, control packets are never queued behind them
+            "lsaTooLarge": 0, # LSAs left out of an LSU because no datagram can hold them
+        }
+        # SPF throttle
+        self.spfDelay = spfDelay
+        self.spfHold = spfHold
+        self.spfMaxHold = spfMaxHold
+        self.spfHoldTime = spfHold # Current hold, backs off up to spfMaxHold
+        self.spfTimer = None # Pending SPF run
+        self.spfChangedIDs = {} # LSAs changed since the last run {area ID: set of IDs, None for full SPF}
+        self.lastSPFTime = float("-inf")
+        # Deadlines {("refresh", selfID) | ("age", (areaID, lsaID)) | ("dead", nbID): when}
+        self.timers = ExpiryHeap(loop, self.expire)
+        self.timers.set(("refresh", selfID), self.clock() + self.jittered(refreshInterval))
+
+    def print_with_time(self, message: str):
+        if self.verbose:
+            print_with_time(message)
+
+    def print_event(self, message: str): # Protocol events, chatty on busy routers
+        if self.verbose and self.traceEvents:
+            print_with_time(message)
+
+    ##### Neighbour table #####
+    def set_nb(self, id: int, state: str):
         id = int(id)
-        sysDBD[id] = lsa[1]
-    dbdLock = 0 # mutex unlock
-
-def compare_DBD(DBD) -> tuple: # Return tuple of ID's to send LSR
-    global sysLSDB
-    global lsdbLock
-    update_sysDBD()
-    lsr = []
-    while lsdbLock: #mutex
-        continue
-    lsdbLock = 1 # mutex lock
-    for lsaID, lsaSeq in DBD.items():
-        if lsaID not in sysLSDB: # missing
-            lsr.append(lsaID)
-        elif sysLSDB[lsaID][1] < lsaSeq: # needs update
-            lsr.append(lsaID)
-    lsdbLock = 0 # mutex unlock
-    return tuple(lsr)
-
-def send_DBD(id: int=0):
-    global sysDBD
-    update_sysDBD() # update sysDBD
-    id = int(id)
-    message = "DBD\n"
-    if not sysDBD: # empty ## May be redundant
-        return
-    for lsaID, lsaSeq in sysDBD.items():
-        message += str(lsaID) + ',' + str(lsaSeq) + '\n'
-    message = message.strip('\n')
-    send_to_id_noRT(message, SELF_ID, id)
-
-##### LSR/LSU #####
-def send_LSR(lsr, id: int):
-    id = int(id)
-    message = "LSR\n"
-    for reqID in lsr:
-        message += str(reqID) + '\n'
-    message = message.strip('\n')
-    send_to_id_noRT(message, SELF_ID, id)
-
-def send_LSU(lsu, mode="single", dstID: int=0):
-    dstID = int(dstID)
-    # Encode as csv
-    message = "LSU\n"
-    for lsa in lsu: # LSU is list
-        temp = str(lsa[0]) + ',' + str(lsa[1]) + ',' # ID, Seq
-        for linkID, cost in lsa[2].items(): # LSA
-            temp += str(linkID) + ':' + str(cost) + ';'
-        temp = temp.strip(';')
-        temp += '\n'
-        message += temp
-    message = message.strip(";\n")
-    # Single
-    if mode == "single":
-        send_to_id_noRT(message, SELF_ID, dstID)
-    # Flood
-    elif mode == "flood":
-        idList = list(nbTable.keys())
-        try:
-            idList.remove(SELF_ID)
-        except ValueError:
-            pass
-        for linkID in idList:
-            send_to_id_noRT(message, SELF_ID, linkID)
-
-##### LSDB #####
-def update_sysLSDB(lsu):
-    global sysLSDB
-    global lsdbLock
-    updatedLSU = []
-    while lsdbLock: # mutex
-        continue
-    lsdbLock = 1 # mutex lock
-    for lsa in lsu:
-        id = lsa[0]
-        lsa.append(int(time.time()))
-        if id in sysLSDB:
-            if sysLSDB[id][1] >= lsa[1]:
+        if state not in STATES:
+            print("Invalid state:", state)
+            return
+        if id not in self.linkTable:
+            return
+        elif id not in self.nbTable:
+            self.nbTable[id] = self.Neighbour()
+            self.start_HELLO(id)
+        elif self.nbTable[id].state != state:
+            nb = self.nbTable[id]
+            self.print_event("update neighbor state " + str(id) + ' ' + state)
+            if nb.state == "TwoWay" and nb.helloTimer is not None: # Back to fast HELLOs
+                nb.helloTimer.cancel()
+                nb.helloTimer = None
+            nb.state = state
+            if state in ("Down", "TwoWay"): # Nothing to deliver until the adjacency is back
+                nb.retransList = {}
+                nb.ackList = {}
+            if state != "Full":
+                self.start_HELLO(id)
+            if state == "Down" and id in self.segmentOf:
+                self.elect_DR(self.segmentOf[id])
+
+    def remove_nb(self, nbID: int):
+        nbID = int(nbID)
+        if nbID not in self.nbTable:
+            return
+        nb = self.nbTable.pop(nbID)
+        for timer in (nb.helloTimer, nb.ackTimer, nb.rxmtTimer):
+            if timer is not None:
+                timer.cancel()
+        self.timers.discard(("dead", nbID))
+        self.print_with_time("remove neighbor " + str(nbID))
+        if nbID in self.segmentOf:
+            self.leave_segment(nbID)
+
+    ##### Links #####
+    def set_link(self, id: int, cost: int):
+        id = int(id)
+        cost = int(cost)
+        if id not in self.linkTable:
+            print("Link not found")
+            return
+        self.print_with_time("update neighbour " + str(id) + ' ' + str(cost))
+        # Update link cost
+        self.linkTable[id] = cost
+        self.originate_LSA()
+
+    def add_link(self, id: int, cost: int):
+        id = int(id)
+        cost = int(cost)
+        if id in self.linkTable:
+            print("Link already exists")
+            return
+        # Add link cost
+        self.linkTable[id] = cost
+        self.update_admitted(id)
+        self.update_areas()
+        # Add to neighbour table
+        self.set_nb(id, "Down")
+        self.print_with_time("add neighbour " + str(id) + ' ' + str(cost))
+        self.originate_LSA()
+        self.fib_changed()
+
+    def remove_link(self, id):
+        self.remove_nb(id)
+        if id not in self.linkTable:
+            print("Link not found")
+            return
+        del self.linkTable[id]
+        self.update_admitted(id)
+        self.areaOf.pop(id, None)
+        self.update_areas()
+        self.originate_LSA()
+        self.fib_changed()
+
+    ##### Areas #####
+    def area_of(self, id: int) -> int: # Area of the link to id, LSAs from elsewhere go to the first area
+        if id in self.linkTable:
+            return self.areaOf.get(id, BACKBONE)
+        return next(iter(self.areas))
+
+    def update_areas(self): # Keep an Area for each area a link is in, call after links move between areas
+        areaIDs = sorted({self.areaOf.get(id, BACKBONE) for id in self.linkTable}) or [BACKBONE]
+        if areaIDs == list(self.areas):
+            return
+        areas = {}
+        for areaID in areaIDs:
+            areas[areaID] = self.areas.get(areaID) or Area({self.selfID: self.sysLSA}, None)
+        for areaID, area in self.areas.items():
+            if areaID not in areas: # LSAs of an area we left are dropped, not aged
+                for id in area.lsdb:
+                    self.timers.discard(("age", (areaID, id)))
+                self.spfChangedIDs.pop(areaID, None)
+        self.areas = areas
+        self.sysLSDB = areas[areaIDs[0]].lsdb
+        if len(areas) == 1:
+            area = areas[areaIDs[0]]
+            area.rt = self.sysRT
+            if area.summary is not None: # No longer an ABR, the summary LSAs age out at the neighbours
+                for part in range(len(area.summary)):
+                    area.lsdb.pop(summary_ID(self.selfID, part), None)
+                area.summary = None
+        else: # ABR, sysRT holds the best routes of all areas
+            for areaID, area in areas.items():
+                if area.rt is None or area.rt is self.sysRT:
+                    area.rt = Routing(self.selfID, log=lambda message: None, summaries=areaID == BACKBONE)
+                if area.summary is None:
+                    area.summary = split_summary(self.selfID, [])
+        self.print_with_time("areas " + ' '.join(str(areaID) for areaID in areaIDs))
+        for areaID in areas:
+            self.attempt_calc_spf(None, areaID)
+
+    def set_area(self, areaID: int, ids): # Move the links to ids into area areaID
+        for id in ids:
+            if self.areaOf.get(id, BACKBONE) == areaID:
                 continue
-            print_with_time("update LSA " + str(id) + ' ' + str(lsa[1]))
+            if areaID == BACKBONE:
+                del self.areaOf[id]
+            else:
+                self.areaOf[id] = areaID
+            if id in self.nbTable: # Synchronise again with the LSDB of the new area
+                self.set_nb(id, "Down")
+        self.update_areas()
+        self.originate_LSA()
+
+    def set_stub(self, areaID: int, stub: bool): # Summarise only a default route into areaID
+        if stub:
+            self.stubAreas.add(areaID)
         else:
-            print_with_time("add LSA " + str(id) + ' ' + str(lsa[1]))
-        sysLSDB[id] = copy.deepcopy(lsa)
-        updatedLSU.append(lsa)
-    if debug: print(sysLSDB)
-    lsdbLock = 0 # mutex unlock
-    if updatedLSU: # If any changes occur
-        attempt_calc_spf()
-        send_LSU(updatedLSU, "flood") # Flood updated LSU
-
-##### System #####
-def print_with_time(message: str):
-    curTime = time.strftime("%H:%M:%S", time.localtime())
-    print(curTime, "-", message)
+            self.stubAreas.discard(areaID)
+        if areaID in self.areas and self.areas[areaID].summary is not None: # Summaries follow the next SPF run
+            self.attempt_calc_spf(None, areaID)
 
-def attempt_calc_spf():
-    global sysLSDB
-    global lsdbLock
-    global sysRT
-    while lsdbLock: # mutex
-        continue
-    lsdbLock = 1 # mutex lock
-    sysRT.calc_spf(sysLSDB) # Calculate shortest path
-    lsdbLock = 0 # mutex unlock
-
-def send_to_id(message, srcID: int, dstID: int, senderID: int=None):
-    global sysRT
-    # Check if bytes-like object
-    try:
-        message = message.decode("utf-8")
-    except AttributeError:
-        pass
-    data = str(srcID) + ',' + str(dstID) + '\n' + message # Add addr header
-    dataBytes = data.encode("utf-8")
-    # spf
-    nextHopID = sysRT.get_next_hop(dstID)
-    if nextHopID is None or nextHopID == senderID: # Avoid return to sender
-        return
-    port = PORT_BASE + nextHopID
-    sock.sendto(dataBytes, (UDP_IP, port))
-    if debug: print("=== SENT ===", data, "==========", sep='\n')
-
-def send_to_id_noRT(message, srcID: int, dstID: int):
-    global sysRT
-    # Check if bytes-like object
-    try:
-        message = message.decode("utf-8")
-    except AttributeError:
-        pass
-    data = str(srcID) + ',' + str(dstID) + '\n' + message # Add addr header
-    dataBytes = data.encode("utf-8")
-    if dstID not in linkTable:
-        return
-    port = PORT_BASE + dstID
-    sock.sendto(dataBytes, (UDP_IP, port))
-    if debug: print("=== SENT NO RT ===", data, "==========", sep='\n')
-        
-def user_input():
-    while True:
-        user_input = input()
+    def intra_IDs(self, areaID: int) -> set: # Routers of the area and the stubs they link to
+        ids = set()
+        for id, lsa in self.areas[areaID].lsdb.items():
+            if id > 0:
+                ids.add(id)
+                ids.update(lsa.linkTable)
+        ids.discard(self.selfID)
+        return {id for id in ids if id > 0}
+
+    def merge_routes(self, intra: dict) -> dict: # Best route of each area into sysRT, return {dstID: (Route, intra-area)}
+        # Intra-area routes win over inter-area ones whatever the cost, equal costs share their next hops
+        merged = {}
+        for areaID, area in self.areas.items():
+            areaIntra = intra[areaID]
+            for dstID, route in area.rt.table.items():
+                isIntra = dstID in areaIntra
+                old = merged.get(dstID)
+                if old is None or (isIntra and not old[1]) or (isIntra == old[1] and route.cost < old[0].cost):
+                    merged[dstID] = (route, isIntra)
+                elif isIntra == old[1] and route.cost == old[0].cost and route != old[0]:
+                    nextHopIDs = tuple(sorted(set(old[0].nextHopIDs).union(route.nextHopIDs)))
+                    merged[dstID] = (Route(nextHopIDs, route.cost), isIntra)
+        table = self.sysRT.table
+        for dstID in [dstID for dstID in table if dstID not in merged]:
+            self.sysRT.set_route(dstID, None)
+        for dstID, (route, isIntra) in merged.items():
+            if table.get(dstID) != route:
+                self.sysRT.set_route(dstID, route)
+        return merged
+
+    def update_summaries(self, intra: dict, merged: dict): # Originate again when a summary LSA changed
+        # Every route not inside an area goes into its summary, only intra-area routes go into the backbone.
+        # A stub area gets a default route instead, its routers reach the rest of the domain through the
+        # nearest ABR. A summary keeps its number of parts while we stay an ABR, a part left empty still drops
+        # its routes.
+        changed = False
+        for areaID, area in self.areas.items():
+            areaIntra = intra[areaID]
+            if areaID in self.stubAreas:
+                routes = [(DEFAULT_ID, 0)]
+            else:
+                routes = sorted((dstID, route.cost) for dstID, (route, isIntra) in merged.items()
+                                if dstID not in areaIntra and (isIntra or areaID != BACKBONE))
+            summary = split_summary(self.selfID, routes, len(area.summary))
+            if summary != area.summary:
+                area.summary = summary
+                changed = True
+        if changed:
+            self.originate_LSA()
+
+    ##### Origination #####
+    def originate_LSA(self): # New instance of the self LSA, also runs when the refresh is due
+        sysLSA = self.sysLSA
+        curTime = self.clock()
+        nextTime = sysLSA.time + self.minLSInterval
+        if sysLSA.seq and curTime < nextTime: # Too soon after the last one, send one instance when allowed
+            self.stats["originateMerged"] += 1
+            self.timers.set(("refresh", self.selfID), nextTime)
+            # Own routes follow the link change right away, neighbours get it with the next Seq
+            self.set_sysLSA(LSA(self.selfID, sysLSA.seq, Links(self.linkTable), sysLSA.time))
+            for areaID in self.areas:
+                self.attempt_calc_spf([self.selfID], areaID)
+            return
+        sysLSA = LSA(self.selfID, sysLSA.seq + 1, Links(self.linkTable), curTime)
+        self.set_sysLSA(sysLSA)
+        self.stats["originated"] += 1
+        self.print_event("update LSA " + str(self.selfID) + ' ' + str(sysLSA.seq))
+        # Flood updated LSAs in each area
+        for areaID, area in self.areas.items():
+            lsu = [area.lsdb[self.selfID]]
+            if area.summary is not None:
+                lsu += [area.lsdb[summary_ID(self.selfID, part)] for part in range(len(area.summary))]
+            self.send_LSU(lsu, "flood", areaID=areaID)
+            self.attempt_calc_spf([lsa.id for lsa in lsu], areaID)
+        self.timers.set(("refresh", self.selfID), curTime + self.jittered(self.refreshInterval))
+
+    def set_sysLSA(self, sysLSA): # Install the self LSA, and on an ABR its summary LSAs, in every area
+        self.sysLSA = sysLSA
+        if len(self.areas) == 1:
+            self.sysLSDB[self.selfID] = sysLSA
+            return
+        for areaID, area in self.areas.items():
+            linkTable = {id: cost for id, cost in sysLSA.linkTable.items() if self.areaOf.get(id, BACKBONE) == areaID}
+            if area.summary is not None:
+                for part, links in enumerate(area.summary):
+                    id = summary_ID(self.selfID, part)
+                    linkTable[id] = 0
+                    area.lsdb[id] = LSA(id, sysLSA.seq, Links(links), sysLSA.time)
+                    self.timers.discard(("age", (areaID, id))) # A neighbour may have synchronised it back to us
+            area.lsdb[self.selfID] = LSA(self.selfID, sysLSA.seq, Links(linkTable), sysLSA.time)
+
+    def jittered(self, interval: float) -> float: # Spread refreshes of routers started together
+        return interval * random.uniform(1 - REFRESH_JITTER, 1)
+
+    ##### HELLO #####
+    def send_HELLO(self, id: int):
+        id = int(id)
+        message = "HELLO\n"
+        if self.nbTable[id].state == "Down":
+            message += "init"
+        else:
+            message += "received"
+        if self.binaryWire:
+            message += "\nbin" # Announce binary control packets
+        if id in self.segmentOf: # Priority and the DR and BDR we see on the segment, '-' for none
+            segment = self.segments[self.segmentOf[id]]
+            message += "\nseg " + ' '.join('-' if x is None else str(x)
+                                            for x in (self.priority, segment.dr, segment.bdr))
+        self.send_to_id_noRT(message, self.selfID, id)
+
+    def start_HELLO(self, id: int): # HELLO every HELLO_INTERVAL until the neighbour is Full
+        nb = self.nbTable[id]
+        if nb.helloTimer is None: # A TwoWay neighbour only needs to be kept alive, as Full ones are by refreshes
+            interval = self.refreshInterval if nb.state == "TwoWay" else HELLO_INTERVAL
+            nb.helloTimer = self.loop.call_later(interval, self.hello_timer, id)
+
+    def hello_timer(self, id: int):
+        nb = self.nbTable[id]
+        nb.helloTimer = None
+        if nb.state == "Full":
+            return
+        self.send_HELLO(id)
+        if nb.state == "Exchange" and self.clock() - nb.lastDBDTime >= RXMT_INTERVAL:
+            self.send_DBD(id) # DBD not answered yet
+        self.start_HELLO(id)
+
+    ##### Broadcast segments #####
+    def join_segment(self, segID: int, ids): # Put the links to ids on segment segID
+        segment = self.segments.setdefault(segID, Segment())
+        for id in ids:
+            if self.segmentOf.get(id) not in (None, segID):
+                self.leave_segment(id)
+            self.segmentOf[id] = segID
+            segment.members.add(id)
+        self.elect_DR(segID)
+
+    def leave_segment(self, id: int):
+        segID = self.segmentOf.pop(id)
+        segment = self.segments[segID]
+        segment.members.discard(id)
+        if segment.members:
+            self.elect_DR(segID)
+        else:
+            del self.segments[segID]
+
+    def recv_segment_HELLO(self, id: int, fields): # HELLO saying id heard us on its segment
+        nb = self.nbTable[id]
+        old = (nb.state, nb.priority, nb.dr, nb.bdr)
+        for field in fields:
+            if field.startswith("seg "):
+                try:
+                    nb.priority, nb.dr, nb.bdr = (None if x == '-' else int(x) for x in field.split()[1:])
+                except ValueError:
+                    print("Bad segment HELLO from", id)
+        if nb.state in ("Down", "Init"):
+            self.set_nb(id, "TwoWay")
+        if (nb.state, nb.priority, nb.dr, nb.bdr) != old:
+            self.elect_DR(self.segmentOf[id])
+        self.update_adjacency(id)
+
+    def elect_DR(self, segID: int): # Elect DR and BDR among self and the two-way neighbours on the segment
+        # Highest (priority, ID) wins, but a router already announcing itself DR or BDR keeps the role so
+        # adjacencies are not rebuilt every time a router joins. Without a DR the BDR is promoted.
+        segment = self.segments[segID]
+        eligible = [] # (priority, ID, announced DR, announced BDR) of routers with a priority
+        if self.priority > 0:
+            eligible.append((self.priority, self.selfID, segment.dr, segment.bdr))
+        for id in segment.members:
+            nb = self.nbTable.get(id)
+            if nb is not None and nb.state in ("TwoWay", "Exchange", "Full") and (nb.priority or 0) > 0:
+                eligible.append((nb.priority, id, nb.dr, nb.bdr))
+        notDR = [r for r in eligible if r[2] != r[1]]
+        bdr = max([r for r in notDR if r[3] == r[1]] or notDR, default=None)
+        dr = max([r for r in eligible if r[2] == r[1]], default=bdr)
+        if dr is not None and dr is bdr:
+            bdr = max([r for r in eligible if r is not dr], default=None)
+        drID = dr[1] if dr else None
+        bdrID = bdr[1] if bdr else None
+        if (drID, bdrID) == (segment.dr, segment.bdr):
+            return
+        segment.dr, segment.bdr = drID, bdrID
+        self.print_event("segment " + str(segID) + " DR " + str(drID) + " BDR " + str(bdrID))
+        for id in segment.members:
+            self.update_adjacency(id)
+
+    def is_adjacent(self, id: int) -> bool: # Exchange LSAs with id, on a segment only with its DR and BDR
+        segID = self.segmentOf.get(id)
+        if segID is None:
+            return True
+        segment = self.segments[segID]
+        return self.selfID in (segment.dr, segment.bdr) or id in (segment.dr, segment.bdr)
+
+    def update_adjacency(self, id: int): # Bring a two-way segment neighbour up to Exchange or back to TwoWay
+        nb = self.nbTable.get(id)
+        if nb is None or nb.state not in ("TwoWay", "Exchange", "Full"):
+            return
+        if self.is_adjacent(id):
+            if nb.state == "TwoWay":
+                self.set_nb(id, "Exchange")
+                self.send_DBD(id)
+        elif nb.state != "TwoWay":
+            self.set_nb(id, "TwoWay")
+
+    def floods_to(self, id: int, fromID: int) -> bool: # Flood an LSU that came from fromID on to id
+        # On a segment the DR floods to everyone, the other routers send LSAs that did not come over the
+        # segment to the DR and BDR only
+        segID = self.segmentOf.get(id)
+        if segID is None:
+            return True
+        segment = self.segments[segID]
+        if segment.dr == self.selfID:
+            return True
+        if self.segmentOf.get(fromID) == segID: # The DR floods it on the segment
+            return False
+        return id in (segment.dr, segment.bdr)
+
+    ##### DBD ######
+    def update_nb_DBD(self, id: int, DBD):
+        id = int(id)
+        if id not in self.nbTable:
+            print("Neighbour not found for DBD")
+            return
+        self.nbTable[id].lastDBD = DBD # Reassembled fresh for every DBD, nothing else holds it
+
+    def update_sysDBD(self, nbID: int): # sysDBD is only updated here with reference to the LSDB of nbID's area
+        self.sysDBD.clear()
+        for id, lsa in self.areas[self.area_of(nbID)].lsdb.items():
+            id = int(id)
+            self.sysDBD[id] = lsa.seq
+
+    def reassemble_DBD(self, id: int, payload): # Return the whole DBD once all its fragments arrived, else None
+        ddSeq, fragIndex, fragCount, dbd = payload
+        if fragCount == 1:
+            return dbd
+        if id not in self.nbTable:
+            return None
+        nb = self.nbTable[id]
+        if nb.rxDDSeq != ddSeq: # Newer DBD, drop the unfinished one
+            nb.rxDDSeq = ddSeq
+            nb.rxDBD = {}
+            nb.rxFrags = set()
+        if len(nb.rxDBD) + len(dbd) > MAX_DBD_ENTRIES:
+            print("DBD from", id, "exceeds", MAX_DBD_ENTRIES, "entries, dropped")
+            nb.rxDDSeq = None
+            nb.rxDBD = None
+            nb.rxFrags = None
+            return None
+        nb.rxDBD.update(dbd)
+        nb.rxFrags.add(fragIndex)
+        if len(nb.rxFrags) < fragCount: # More fragments to come
+            return None
+        dbd = nb.rxDBD
+        nb.rxDDSeq = None
+        nb.rxDBD = None
+        nb.rxFrags = None
+        return dbd
+
+    def compare_DBD(self, DBD, nbID: int) -> tuple: # Return tuple of ID's to send LSR
+        sysLSDB = self.areas[self.area_of(nbID)].lsdb
+        lsr = []
+        for lsaID, lsaSeq in DBD.items():
+            if lsaID not in sysLSDB: # missing
+                lsr.append(lsaID)
+            elif sysLSDB[lsaID].seq < lsaSeq: # needs update
+                lsr.append(lsaID)
+        return tuple(lsr)
+
+    def send_DBD(self, id: int=0):
+        id = int(id)
+        self.update_sysDBD(id) # update sysDBD
+        if id in self.nbTable:
+            self.nbTable[id].lastDBDTime = self.clock()
+        if not self.sysDBD: # empty ## May be redundant
+            return
+        self.ddSeq += 1
+        chunks = wire.split("DBD", list(self.sysDBD.items()), MAX_PACKET)
+        for fragIndex, chunk in enumerate(chunks):
+            self.send_control("DBD", (self.ddSeq, fragIndex, len(chunks), dict(chunk)), [id])
+
+    ##### LSR/LSU #####
+    def send_LSR(self, lsr, id: int):
+        id = int(id)
+        for chunk in wire.split("LSR", lsr, MAX_PACKET):
+            self.send_control("LSR", chunk, [id])
+
+    def is_flood_target(self, id: int, nb) -> bool: # Neighbour exchanging LSAs with us
+        return nb.state in ("Exchange", "Full") and id != self.selfID
+
+    def send_LSU(self, lsu, mode="single", dstID: int=0, exceptID: int=None, areaID: int=None):
+        # areaID: flood only to neighbours in that area
+        dstID = int(dstID)
+        # Single
+        if mode == "single":
+            idList = [dstID]
+        # Flood to neighbours exchanging LSAs, except the one the LSU came from
+        elif mode == "flood":
+            idList = []
+            for id, nb in self.nbTable.items():
+                if (self.is_flood_target(id, nb) and id != exceptID and self.floods_to(id, exceptID)
+                        and (areaID is None or self.area_of(id) == areaID)):
+                    idList.append(id)
+        else:
+            return
+        sentTime = self.clock()
+        for id in idList: # Keep until acknowledged
+            if id in self.nbTable:
+                nb = self.nbTable[id]
+                for lsa in lsu:
+                    nb.retransList[lsa.id] = (lsa.seq, sentTime)
+                if nb.rxmtTimer is None:
+                    nb.rxmtTimer = self.loop.call_later(RXMT_INTERVAL, self.retransmit_LSU, id)
+        for chunk in self.split_LSU(lsu):
+            self.send_control("LSU", chunk, idList)
+
+    def split_LSU(self, lsu) -> list: # Packets of whole LSAs, an LSA no datagram can hold is reported and left out
+        chunks = []
+        for chunk in wire.split("LSU", lsu, MAX_PACKET):
+            if len(chunk) == 1 and wire.entry_size("LSU", chunk[0]) + wire.HEADER_ROOM > MAX_DATAGRAM:
+                self.print_with_time("LSA " + str(chunk[0].id) + " too large to send, " + str(len(chunk[0].linkTable)) + " links")
+                self.stats["lsaTooLarge"] += 1
+                continue
+            chunks.append(chunk)
+        return chunks
+
+    def retransmit_LSU(self, id: int): # Resend LSAs the neighbour has not acknowledged in time
+        sysLSDB = self.areas[self.area_of(id)].lsdb
+        nb = self.nbTable[id]
+        nb.rxmtTimer = None
+        curTime = self.clock()
+        lsu = []
+        for lsaID, (lsaSeq, sentTime) in list(nb.retransList.items()):
+            if lsaID not in sysLSDB or sysLSDB[lsaID].seq != lsaSeq: # Aged out or replaced by a newer instance
+                del nb.retransList[lsaID]
+            elif curTime >= sentTime + RXMT_INTERVAL: # Same sum as dueTime below, so a due LSA is always sent
+                lsu.append(sysLSDB[lsaID])
+                nb.retransList[lsaID] = (lsaSeq, curTime)
+        for chunk in self.split_LSU(lsu):
+            self.send_control("LSU", chunk, [id])
+        if nb.retransList: # Check again when the oldest one is due
+            dueTime = min(sentTime for lsaSeq, sentTime in nb.retransList.values()) + RXMT_INTERVAL
+            nb.rxmtTimer = self.loop.call_at(dueTime, self.retransmit_LSU, id)
+
+    ##### ACK #####
+    def queue_ACK(self, id: int, lsu): # Acknowledge received LSAs with the next batch
+        if id not in self.nbTable:
+            return
+        nb = self.nbTable[id]
+        for lsa in lsu:
+            nb.ackList[lsa.id] = max(lsa.seq, nb.ackList.get(lsa.id, lsa.seq))
+            if nb.retransList.get(lsa.id, (None,))[0] == lsa.seq: # Neighbour already has it, implied ack
+                nb.retransList.pop(lsa.id, None)
+        if nb.ackList and nb.ackTimer is None:
+            nb.ackTimer = self.loop.call_later(ACK_DELAY, self.send_ACK, id)
+
+    def send_ACK(self, id: int): # Send queued acks to a neighbour in as few packets as possible
+        nb = self.nbTable[id]
+        nb.ackTimer = None
+        ack = nb.ackList
+        nb.ackList = {}
+        if ack:
+            for chunk in wire.split("ACK", list(ack.items()), MAX_PACKET):
+                self.send_control("ACK", chunk, [id])
+
+    def recv_ACK(self, id: int, ack):
+        if id not in self.nbTable:
+            return
+        retransList = self.nbTable[id].retransList
+        for lsaID, lsaSeq in ack:
+            if lsaID in retransList and retransList[lsaID][0] <= lsaSeq:
+                retransList.pop(lsaID, None)
+
+    ##### LSDB #####
+    def update_sysLSDB(self, lsu, srcID: int=None) -> set: # srcID: neighbour the LSU came from
+        # Return IDs of LSAs dropped by minLSArrival, they must not be acknowledged
+        droppedIDs = set()
+        areaID = self.area_of(srcID)
+        updatedLSU = self.install_LSU(lsu, droppedIDs, areaID)
+        if updatedLSU: # If any changes occur
+            self.attempt_calc_spf([lsa.id for lsa in updatedLSU], areaID)
+            self.send_LSU(updatedLSU, "flood", exceptID=srcID, areaID=areaID) # Flood updated LSU within the area
+        return droppedIDs
+
+    def install_LSU(self, lsu, droppedIDs=None, areaID: int=None) -> list: # Return newer LSAs installed
+        if areaID is None:
+            areaID = next(iter(self.areas))
+        sysLSDB = self.areas[areaID].lsdb
+        curTime = self.clock()
+        updatedLSU = []
+        for lsa in lsu:
+            id = lsa.id
+            if id in sysLSDB:
+                if sysLSDB[id].seq >= lsa.seq:
+                    continue
+                if curTime - sysLSDB[id].time < self.minLSArrival: # Newer instance too soon
+                    self.stats["arrivalDropped"] += 1
+                    if droppedIDs is not None:
+                        droppedIDs.add(id)
+                    continue
+                self.print_event("update LSA " + str(id) + ' ' + str(lsa.seq))
+            else:
+                self.print_event("add LSA " + str(id) + ' ' + str(lsa.seq))
+            lsa = LSA(id, lsa.seq, lsa.linkTable, curTime) # Link table is taken over from the parsed LSU, not copied
+            sysLSDB[id] = lsa
+            updatedLSU.append(lsa)
+            self.stats["installed"] += 1
+            if id != self.selfID: # The self LSA is refreshed, never aged, and set_sysLSA() keeps our summary LSAs from aging
+                self.timers.set(("age", (areaID, id)), curTime + self.maxAge)
+        if debug: print(sysLSDB)
+        return updatedLSU
+
+    def age_LSA(self, areaID: int, id: int): # LSA not refreshed within maxAge
+        del self.areas[areaID].lsdb[id]
+        self.print_event("remove LSA " + str(id))
+        self.set_nb(id, "Down")
+        self.attempt_calc_spf([id], areaID)
+
+    ##### Timers #####
+    def expire(self, key): # Deadline in self.timers passed
+        kind, id = key
+        if kind == "refresh":
+            self.originate_LSA()
+        elif kind == "age": # id is (areaID, lsaID)
+            self.age_LSA(*id)
+        elif kind == "dead":
+            if id in self.nbTable and self.nbTable[id].state != "Down":
+                self.print_event("neighbor dead " + str(id))
+                self.set_nb(id, "Down")
+
+    def heard_from(self, id: int): # Any packet from a neighbour keeps it alive for deadInterval
+        if id in self.nbTable:
+            self.timers.set(("dead", id), self.clock() + self.deadInterval)
+
+    def set_timers(self, refreshInterval: float, maxAge: float, deadInterval: float):
+        self.refreshInterval = refreshInterval
+        self.maxAge = maxAge # LSAs installed from now on
+        self.deadInterval = deadInterval # Neighbours heard from now on
+        self.timers.set(("refresh", self.selfID), self.sysLSA.time + self.jittered(refreshInterval))
+
+    ##### System #####
+    def attempt_calc_spf(self, changedIDs=None, areaID: int=None):
+        # changedIDs: LSAs changed since last run, None for full SPF. areaID: area of the LSAs, None for all areas
+        # SPF runs spfDelay after the first change but no sooner than the hold time after the last run,
+        # every change until then is merged into that run
+        self.stats["spfTriggers"] += 1
+        for areaID in (self.areas if areaID is None else (areaID,)):
+            if changedIDs is None:
+                self.spfChangedIDs[areaID] = None
+            elif self.spfChangedIDs.get(areaID, ()) is not None:
+                self.spfChangedIDs.setdefault(areaID, set()).update(changedIDs)
+        if self.spfTimer is None:
+            runTime = max(self.clock() + self.spfDelay, self.lastSPFTime + self.spfHoldTime)
+            self.spfTimer = self.loop.call_at(runTime, self.run_spf)
+
+    def run_spf(self):
+        self.spfTimer = None
+        curTime = self.clock()
+        if curTime - self.lastSPFTime >= self.spfMaxHold: # Quiet for a while, start over
+            self.spfHoldTime = self.spfHold
+        else: # Changes keep coming, back off
+            self.spfHoldTime = min(self.spfHoldTime * 2, self.spfMaxHold)
+        self.lastSPFTime = curTime
+        spfChangedIDs = self.spfChangedIDs
+        self.spfChangedIDs = {}
+        self.stats["spfRuns"] += 1
+        for areaID, changedIDs in spfChangedIDs.items(): # Calculate shortest path in each area that changed
+            if areaID in self.areas:
+                area = self.areas[areaID]
+                area.rt.calc_spf(area.lsdb, changedIDs)
+        if len(self.areas) > 1:
+            intra = {areaID: self.intra_IDs(areaID) for areaID in self.areas}
+            merged = self.merge_routes(intra)
+            self.update_summaries(intra, merged)
+        self.fib_changed()
+
+    def fib_snapshot(self) -> tuple: # (IDs admitted, {dstID: Route}) for worker processes, copies they can keep
+        return frozenset(self.admitted), dict(self.sysRT.table)
+
+    def fib_changed(self): # Routes or admission changed, workers forwarding for this router need a new snapshot
+        if hasattr(self.transport, "publish_fib"):
+            self.transport.publish_fib()
+
+    def send_to_id(self, message, srcID: int, dstID: int, senderID: int=None) -> bool: # False when there is no next hop
+        # Check if bytes-like object
+        try:
+            message = message.decode("utf-8")
+        except AttributeError:
+            pass
+        data = str(srcID) + ',' + str(dstID) + '\n' + message # Add addr header
+        dataBytes = data.encode("utf-8")
+        # spf, flows are hashed over equal-cost next hops
+        nextHopID = self.sysRT.get_next_hop(dstID, srcID, senderID)
+        if nextHopID is None or nextHopID == senderID: # Avoid return to sender
+            return False
+        self.transport.sendto(dataBytes, nextHopID)
+        if debug: print("=== SENT ===", data, "==========", sep='\n')
+        return True
+
+    def send_control(self, pktType: str, payload, dstIDs): # Encode DBD/LSR/LSU once per wire format and send to neighbours
+        message = None
+        body = None
+        for dstID in dstIDs:
+            if self.binaryWire and dstID in self.nbTable and self.nbTable[dstID].binary:
+                if body is None:
+                    body = wire.PACK[pktType](payload)
+                self.send_bytes_noRT(wire.pack(pktType, self.selfID, dstID, body), dstID)
+            else:
+                if message is None:
+                    message = pktType + '\n' + wire.TEXT[pktType](payload) # Encode as csv
+                self.send_to_id_noRT(message, self.selfID, dstID)
+
+    def send_bytes_noRT(self, dataBytes, dstID: int): # dataBytes already has its header
+        if dstID not in self.linkTable:
+            return
+        self.transport.sendto(dataBytes, dstID)
+        if debug: print("=== SENT BINARY ===", dataBytes, "==========", sep='\n')
+
+    def send_to_id_noRT(self, message, srcID: int, dstID: int):
+        # Check if bytes-like object
+        try:
+            message = message.decode("utf-8")
+        except AttributeError:
+            pass
+        data = str(srcID) + ',' + str(dstID) + '\n' + message # Add addr header
+        dataBytes = data.encode("utf-8")
+        if dstID not in self.linkTable:
+            return
+        self.transport.sendto(dataBytes, dstID)
+        if debug: print("=== SENT NO RT ===", data, "==========", sep='\n')
+
+    def command(self, user_input: str) -> bool: # Run one operator command, return False on exit
         command = user_input.split()
         if len(command) <= 0:
-            continue
+            return True
 
         # len 1
         elif command[0] == "exit":
-            sys.exit()
+            return False
 
         # len 2
         elif command[0] == "rmlink":
-            def rmlink_help():
+            def help_rmlink():
                 print("rmlink <ROUTER ID>")
             if len(command) != 2:
-                rmlink_help()
-                continue
+                help_rmlink()
+                return True
             try:
-                remove_link(int(command[1]))
+                self.remove_link(int(command[1]))
             except ValueError:
-                rmlink_help()
+                help_rmlink()
 
         # len 3
         elif command[0] == "setlink":
@@ -388,195 +1427,396 @@ def user_input():
                 print("setlink <ROUTER ID> <COST>")
             if len(command) != 3:
                 help_setlink()
-                continue
+                return True
             try:
-                set_link(int(command[1]), int(command[2]))
+                self.set_link(int(command[1]), int(command[2]))
             except ValueError:
                 help_setlink()
-                
+
         elif command[0] == "addlink":
             def help_addlink():
                 print("addlink <ROUTER ID> <COST>")
             if len(command) != 3:
                 help_addlink()
-                continue
+                return True
             try:
-                if int(command[1]) == SELF_ID:
+                if int(command[1]) == self.selfID:
                     print("Cannot add link to self")
-                    continue
-                add_link(int(command[1]), int(command[2]))
+                    return True
+                self.add_link(int(command[1]), int(command[2]))
             except ValueError:
                 help_addlink()
 
+        elif command[0] == "segment":
+            def help_segment():
+                print("segment [<SEGMENT ID> <ROUTER ID> ...]\nPut links on a broadcast segment, list segments without arguments")
+            if len(command) == 1:
+                for segID, segment in sorted(self.segments.items()):
+                    print(segID, "DR", segment.dr, "BDR", segment.bdr, sorted(segment.members))
+                return True
+            if len(command) < 3:
+                help_segment()
+                return True
+            try:
+                segID, *ids = (int(i) for i in command[1:])
+            except ValueError:
+                help_segment()
+                return True
+            if any(id not in self.linkTable for id in ids):
+                print("Link not found")
+                return True
+            self.join_segment(segID, ids)
+
+        elif command[0] == "area":
+            def help_area():
+                print("area [<AREA ID> <ROUTER ID> ...]\nPut links in an area, " + str(BACKBONE) + " is the backbone, list areas without arguments")
+            if len(command) == 1:
+                for areaID, area in self.areas.items():
+                    print(areaID, sorted(id for id in self.linkTable if self.area_of(id) == areaID),
+                          len(area.lsdb), "LSAs", "ABR" if area.summary is not None else '',
+                          "stub" if areaID in self.stubAreas else '')
+                return True
+            if len(command) < 3:
+                help_area()
+                return True
+            try:
+                areaID, *ids = (int(i) for i in command[1:])
+            except ValueError:
+                help_area()
+                return True
+            if areaID < 0:
+                help_area()
+                return True
+            if any(id not in self.linkTable for id in ids):
+                print("Link not found")
+                return True
+            self.set_area(areaID, ids)
+
+        elif command[0] == "stub":
+            def help_stub():
+                print("stub <AREA ID> [off]\nAs its ABR, summarise only a default route into an area, the backbone cannot be one")
+            if len(command) not in (2, 3) or len(command) == 3 and command[2] != "off":
+                help_stub()
+                return True
+            try:
+                areaID = int(command[1])
+            except ValueError:
+                help_stub()
+                return True
+            if areaID <= BACKBONE:
+                help_stub()
+                return True
+            self.set_stub(areaID, len(command) == 2)
+
+        elif command[0] == "priority":
+            def help_priority():
+                print("priority <PRIORITY>\nDR election priority, 0 never becomes DR or BDR")
+            if len(command) != 2:
+                help_priority()
+                return True
+            try:
+                priority = int(command[1])
+            except ValueError:
+                help_priority()
+                return True
+            if priority < 0:
+                help_priority()
+                return True
+            self.priority = priority
+            for segID in self.segments:
+                self.elect_DR(segID)
+
         elif command[0] == "send":
             def help_send():
                 print("send <ROUTER ID> <MESSAGE>")
             if len(command) != 3:
                 help_send()
-                continue
+                return True
             try:
                 int(command[1])
             except ValueError:
                 help_send()
-                continue
+                return True
             message = "MSG\n" + command[2] # Add type header
-            send_to_id(message, SELF_ID, int(command[1]))
-            
+            self.send_to_id(message, self.selfID, int(command[1]))
+
+        elif command[0] == "wire":
+            def help_wire():
+                print("wire <text|bin>")
+            if len(command) != 2 or command[1] not in ("text", "bin"):
+                help_wire()
+                return True
+            self.binaryWire = command[1] == "bin"
+            for id, nb in self.nbTable.items(): # Neighbours learn it from a HELLO, Full ones get none otherwise
+                if self.is_flood_target(id, nb):
+                    self.send_HELLO(id)
+
+        elif command[0] == "bufsize":
+            def help_bufsize():
+                print("bufsize <BYTES>")
+            if len(command) != 2:
+                help_bufsize()
+                return True
+            try:
+                size = int(command[1])
+            except ValueError:
+                help_bufsize()
+                return True
+            if size < MAX_PACKET:
+                print("Buffer must hold at least", MAX_PACKET, "bytes")
+                return True
+            self.recvBufSize = size
+            if hasattr(self.transport, "set_recv_size"):
+                self.transport.set_recv_size(size)
+
+        elif command[0] == "dataqueue":
+            def help_dataqueue():
+                print("dataqueue [<PACKETS>]\nData packets held while control packets go first, more are dropped")
+            if len(command) == 1:
+                print("dataqueue", self.dataQueueLen, "dropped", self.stats["dataDropped"])
+                return True
+            if len(command) != 2:
+                help_dataqueue()
+                return True
+            try:
+                size = int(command[1])
+            except ValueError:
+                help_dataqueue()
+                return True
+            if size < 1:
+                help_dataqueue()
+                return True
+            self.dataQueueLen = size
+
+        elif command[0] == "workers":
+            def help_workers():
+                print("workers [<COUNT>]\nProcesses forwarding data on the router's port, 0 stops them")
+            if not hasattr(self.transport, "set_workers"):
+                print("Transport has no worker processes")
+                return True
+            if len(command) == 1:
+                print(self.transport.workers.count if self.transport.workers else 0, "workers")
+                return True
+            if len(command) != 2:
+                help_workers()
+                return True
+            try:
+                count = int(command[1])
+            except ValueError:
+                help_workers()
+                return True
+            if count < 0:
+                help_workers()
+                return True
+            self.transport.set_workers(count)
+
+        elif command[0] == "timers":
+            def help_timers():
+                print("timers [<REFRESH> <MAX AGE> <DEAD>]\nSeconds, max age and dead must be longer than refresh")
+            if len(command) == 1:
+                print("refresh", self.refreshInterval, "maxage", self.maxAge, "dead", self.deadInterval)
+                return True
+            if len(command) != 4:
+                help_timers()
+                return True
+            try:
+                refreshInterval, maxAge, deadInterval = (float(i) for i in command[1:])
+            except ValueError:
+                help_timers()
+                return True
+            if not 0 < refreshInterval < min(maxAge, deadInterval): # Neighbours are only heard from on refresh once Full
+                help_timers()
+                return True
+            self.set_timers(refreshInterval, maxAge, deadInterval)
+
+        elif command[0] == "stats":
+            for key, value in self.stats.items():
+                print(key, value)
+            print("spfSaved", self.stats["spfTriggers"] - self.stats["spfRuns"])
+
         elif command[0] == "links":
-            global linkTable
-            print(linkTable)
+            print(self.linkTable)
 
         elif command[0] == "rt":
-            global sysRT
-            print(sysRT.table)
+            print({dstID: list(route) for dstID, route in self.sysRT.table.items()})
+
+        elif command[0] == "lsdb":
+            for areaID, area in self.areas.items():
+                if len(self.areas) > 1:
+                    print("area", areaID)
+                for id, lsa in sorted(area.lsdb.items()):
+                    print(id, lsa.seq, lsa.linkTable)
+
+        elif command[0] == "dump":
+            def help_dump():
+                print("dump <FILE>\nWrite the LSDB for analyze.py")
+            if len(command) != 2:
+                help_dump()
+                return True
+            try:
+                with open(command[1], 'w') as f:
+                    f.write(wire.text_LSU(sorted(self.sysLSDB.values())) + '\n')
+            except OSError as e:
+                print("Cannot write", command[1] + ':', e)
+                return True
+            print("LSDB written to", command[1])
 
         elif command[0] == "nb":
-            global nbTable
-            for key, nb in nbTable.items():
+            for key, nb in self.nbTable.items():
                 print(key, nb.state)
 
         else:
             print("Unknown command:", user_input)
+        return True
 
-def receiving():
-    global nbTable
-    global linkTable
-    global sysLSDB
-    global sysRT
-    while True:
-        try:
-            data, addr = sock.recvfrom(1024) # BLOCKING
-        except socket.timeout:
-            continue
+    def admits(self, id: int) -> bool: # Accept datagrams only over a link
+        return id in self.linkTable
+
+    def update_admitted(self, id: int): # Call when anything admits() looks at changes for id
+        if self.admits(id):
+            self.admitted.add(id)
+        else:
+            self.admitted.discard(id)
+
+    def handle_packet(self, data, fromID: int): # One received datagram, fromID: neighbour that sent it
         # Drop packet
-        if addr[1] == UDP_PORT:
-            continue
-        if addr[1]-PORT_BASE not in linkTable: # No link
-            continue
+        if fromID == self.selfID:
+            return
+        if fromID not in self.admitted: # No link
+            return
+        self.heard_from(fromID)
+        # Transit data packet, read only the address header and send the datagram on as it is
+        addr = peek_data(data)
+        if addr is not None:
+            srcID, dstID = addr
+            if dstID != self.selfID and self.forward_data(data, srcID, dstID, fromID):
+                if self.verbose:
+                    pktData = bytes(data).split(b'\n', 2)[2]
+                    print("Forward message from", str(srcID), "to", str(dstID) + ':', str(pktData, "utf-8", "replace"))
+                return
         # Parse data
-        message = data.decode("utf-8")
-        parts = message.split('\n', 2)
-        if len(parts) != 3:
-            print("Received something weird:", message)
-            continue
-        pktAddr, pktType, pktData = parts
-        srcID, dstID = pktAddr.split(',')
-        srcID, dstID = int(srcID), int(dstID)
+        message = None
+        if wire.is_binary(data): # Binary DBD/LSR/LSU from a neighbour
+            srcID, dstID, pktType, body = wire.unpack(data)
+            pktData = wire.UNPACK[pktType](body)
+        else:
+            message = str(data, "utf-8")
+            parts = message.split('\n', 2)
+            if len(parts) != 3:
+                print("Received something weird:", message)
+                return
+            pktAddr, pktType, pktData = parts
+            srcID, dstID = pktAddr.split(',')
+            srcID, dstID = int(srcID), int(dstID)
+            if dstID == self.selfID and pktType in wire.PARSE:
+                pktData = wire.PARSE[pktType](pktData)
         # Forward packet
-        if dstID != SELF_ID:
-            if pktType in ('MSG', 'TUN', 'AGENT'):
-                print("Forward message from", str(srcID), "to", str(dstID) + ':', pktData)
-                message = pktType + '\n' + pktData
-                send_to_id(message, srcID, dstID, senderID=addr[1]-PORT_BASE)
-                continue
+        if dstID != self.selfID:
+            self.forward_packet(message, pktType, pktData, srcID, dstID, fromID)
         # Parse data according to type
         else:
-            if pktType == "HELLO":
-                if pktData == "init":
-                    set_nb(srcID, "Init")
-                elif pktData == "received":
-                    if nbTable[srcID].state != "Full":
-                        set_nb(srcID, "Exchange") 
-                    send_DBD(srcID) # In case last DBD not received
-                    
-            elif pktType == "DBD":
-                if debug: print("DBD debug:", pktData)
-                pktDBD = {}
-                for i in pktData.split('\n'):
-                    dbdID, dbdSeq = i.split(',')
-                    pktDBD[int(dbdID)] = int(dbdSeq)
-                lsr = compare_DBD(pktDBD)
-                if lsr:
-                    send_LSR(lsr, srcID)
-                else: 
-                    if nbTable[srcID].state != "Full":
-                        send_DBD(srcID) # Last DBD
-                    set_nb(srcID, "Full")
-                    
-            elif pktType == "LSR":
-                if debug: print("LSR debug:", pktData)
-                idList = pktData.split('\n')
-                lsu = []
-                for id in idList:
-                    lsu.append(sysLSDB[int(id)])
-                send_LSU(lsu, "single", srcID)
-
-            elif pktType == "LSU":
-                if debug: print("LSU debug:", pktData)
-                pktLSU = []
-                for i in pktData.split('\n'): # LSA per router
-                    id, seq, strLink = i.split(',')
-                    id, seq = int(id), int(seq)
-                    updateLink = {}
-                    for j in strLink.split(';'): # For each link in linkTable
-                        linkID, linkCost = j.split(':') # Link table dict (ID, Cost)
-                        updateLink[int(linkID)] = int(linkCost)
-                    pktLSU.append([id, seq, updateLink])
-                if debug: print("pktLSU debug:", pktLSU)
-                update_sysLSDB(pktLSU)
-
-            elif pktType == "MSG":
-                print("Recv message from", str(srcID) + ':', pktData)
+            self.deliver_packet(pktType, pktData, srcID)
+
+    def forward_data(self, data, srcID: int, dstID: int, fromID: int) -> bool:
+        # Send a transit data datagram on unchanged, False leaves it to forward_packet()
+        # (no route, or the only next hop is the sender)
+        nextHopID = self.sysRT.get_next_hop(dstID, srcID, fromID)
+        if nextHopID is None or nextHopID == fromID: # Avoid return to sender
+            return False
+        self.transport.sendto(data, nextHopID)
+        return True
+
+    def forward_packet(self, message, pktType: str, pktData, srcID: int, dstID: int, fromID: int):
+        if pktType in ('MSG', 'TUN', 'AGENT'):
+            message = pktType + '\n' + pktData
+            if self.send_to_id(message, srcID, dstID, senderID=fromID) and self.verbose:
+                print("Forward message from", str(srcID), "to", str(dstID) + ':', pktData)
+
+    def deliver_packet(self, pktType: str, pktData, srcID: int): # Packet addressed to this router
+        nbTable = self.nbTable
+        if pktType == "HELLO":
+            hello = pktData.split('\n')
+            if hello[0] == "init":
+                self.set_nb(srcID, "Init")
+            elif hello[0] == "received":
+                if srcID in self.segmentOf: # The election decides whether to exchange
+                    self.recv_segment_HELLO(srcID, hello[1:])
+                elif nbTable[srcID].state != "Full":
+                    self.set_nb(srcID, "Exchange")
+                if self.is_adjacent(srcID) and self.clock() - nbTable[srcID].lastDBDTime >= RXMT_INTERVAL:
+                    self.send_DBD(srcID) # In case last DBD not received
+            if srcID in nbTable:
+                nbTable[srcID].binary = "bin" in hello[1:]
 
+        elif pktType == "DBD":
+            if debug: print("DBD debug:", pktData)
+            if not self.is_adjacent(srcID): # Segment neighbour that is neither DR nor BDR
+                return
+            pktDBD = self.reassemble_DBD(srcID, pktData)
+            if pktDBD is None: # Waiting for more fragments
+                return
+            lsr = self.compare_DBD(pktDBD, srcID)
+            if lsr:
+                self.send_LSR(lsr, srcID)
             else:
-                print("Unknown packet type from", srcID)
-
-def system():
-    global nbTable
-    global sysLSA
-    global sysLSDB
-    global lsdbLock
-    global sysRT
-    while True:
-        curTime = int(time.time())
-        # Check each LSA for refresh / timeout
-        lsu = []
-        idDel = []
-        while lsdbLock: # mutex
-            continue
-        lsdbLock = 1 # mutex lock
-        if curTime - sysLSA[3] >= 15: # Refresh self LSA
-            sysLSA[1] += 1 # Seq += 1
-            sysLSA[3] = int(time.time())
-            print_with_time("update LSA " + str(SELF_ID) + ' ' + str(sysLSA[1]))
-            lsu.append(sysLSA) # add to LSU to flood
-            send_LSU(lsu, "flood")
-        for id, lsa in sysLSDB.items():
-            if curTime - lsa[3] >= 30: # Timeout
-                idDel.append(id)
-        try:
-            idDel.remove(SELF_ID) # Ignore self ID
-        except ValueError:
-            pass
-        for id in idDel:
-            del sysLSDB[id]
-            print_with_time("remove LSA " + str(id))
-            set_nb(id, "Down")
-        lsdbLock = 0 # mutex unlock
-
-        # LSU
-        if lsu or idDel: # not empty
-            attempt_calc_spf()
-
-        # Interval task
-        for id in nbTable.keys():
-            id = int(id)
-            if nbTable[id].state != "Full":
-                send_HELLO(id)
-            if nbTable[id].state == "Exchange":
-                send_DBD(id)
+                if nbTable[srcID].state != "Full":
+                    self.send_DBD(srcID) # Last DBD
+                self.set_nb(srcID, "Full")
+
+        elif pktType == "LSR":
+            if debug: print("LSR debug:", pktData)
+            lsdb = self.areas[self.area_of(srcID)].lsdb
+            lsu = []
+            for id in pktData:
+                if id in lsdb: # May have aged out since the DBD
+                    lsu.append(lsdb[id])
+            if lsu:
+                self.send_LSU(lsu, "single", srcID)
+
+        elif pktType == "LSU":
+            if debug: print("LSU debug:", pktData)
+            droppedIDs = self.update_sysLSDB(pktData, srcID)
+            self.queue_ACK(srcID, [lsa for lsa in pktData if lsa.id not in droppedIDs])
 
-        # 1 second interval
-        time.sleep(1)
+        elif pktType == "ACK":
+            if debug: print("ACK debug:", pktData)
+            self.recv_ACK(srcID, pktData)
 
+        elif pktType == "MSG":
+            print("Recv message from", str(srcID) + ':', pktData)
+
+        else:
+            print("Unknown packet type from", srcID)
+
+    async def serve(self): # Serve the UDP port and stdin commands until "exit"
+        UDPTransport(self, self.loop)
+        async for line in read_lines(self.loop):
+            if not self.command(line):
+                break
+        self.transport.close()
+
+def get_self_id(name: str) -> int: # ID from the command line, random if not given
+    if len(sys.argv) > 1:
+        selfID = int(sys.argv[1])
+    else:
+        print(name, "ID not given, generating random ID")
+        selfID = random.randint(1, 99)
+    print(name + " ID:", selfID)
+    return selfID
+
+
+def main(routerClass, name: str="Router"): # Serve one router on UDP until "exit"
+    selfID = get_self_id(name)
+    async def serve():
+        await routerClass(selfID, asyncio.get_running_loop()).serve()
+    stdinFD = os.dup(sys.stdin.fileno()) # Same pipe or terminal, the loop closes stdin itself on exit
+    stdinBlocking = os.get_blocking(stdinFD) # read_lines() makes it non-blocking
+    try:
+        asyncio.run(serve())
+    finally: # The shell shares the terminal
+        os.set_blocking(stdinFD, stdinBlocking)
+        os.close(stdinFD)
 
 
 if __name__ == '__main__':
-    t1 = Thread(target=receiving)
-    t2 = Thread(target=system)
-    t3 = Thread(target=user_input)
-    t1.daemon = True
-    t2.daemon = True
-    t1.start()
-    t2.start()
-    t3.start()
\ No newline at end of file
+    main(Router)
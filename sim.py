@@ -0,0 +1,194 @@
+# Simulate many routers in one process over an in-memory network
+# Usage: python sim.py [ROUTERS] [ring|grid|random] [agent]
+# Every router is a Router (or Agent) from ospf.py/agent.py with its own tables. The fabric stands in for
+# both the asyncio loop and the sockets: it runs every router's timers in order on a simulated clock and
+# delivers the datagrams they send until the network is quiet, so simulated time runs as fast as the CPU
+# allows.
+import sys, time, random, resource, heapq
+from collections import deque
+from ospf import Router, RXMT_INTERVAL, MIN_LS_INTERVAL, SPF_MAX_HOLD, DEFAULT_ID
+
+# Routes unchanged this long after a link fails count as recomputed: an origination held back by
+# minLSInterval, an LSA dropped by minLSArrival and retransmitted, and the throttled SPF run they trigger
+QUIET_TIME = RXMT_INTERVAL + MIN_LS_INTERVAL + SPF_MAX_HOLD
+
+class Timer: # Handle returned by Fabric.call_at, like asyncio.TimerHandle
+    def __init__(self, callback, args):
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+class Port: # Transport of one router on the fabric
+    def __init__(self, fabric, selfID: int):
+        self.fabric = fabric
+        self.selfID = selfID
+        self.closed = False # Router failed, its timers still run but nothing leaves
+
+    def sendto(self, dataBytes, dstID: int):
+        if self.closed:
+            return
+        self.fabric.queue.append((dstID, self.selfID, dataBytes))
+        self.fabric.sent += 1
+
+class Fabric:
+    def __init__(self):
+        self.now = 0.0 # Simulated seconds
+        self.routers = {} # {ID: Router}
+        self.queue = deque() # Datagrams in flight (dstID, srcID, dataBytes)
+        self.sent = 0 # Datagrams sent so far
+        self.timers = [] # Heap of (when, order, Timer)
+        self.timerCount = 0 # Timers scheduled so far, keeps equal times in order
+
+    ##### Loop #####
+    def time(self) -> float:
+        return self.now
+
+    def call_at(self, when: float, callback, *args) -> Timer:
+        timer = Timer(callback, args)
+        heapq.heappush(self.timers, (when, self.timerCount, timer))
+        self.timerCount += 1
+        return timer
+
+    def call_later(self, delay: float, callback, *args) -> Timer:
+        return self.call_at(self.now + delay, callback, *args)
+
+    def run_until(self, endTime: float): # Fire every timer due by endTime, delivering datagrams after each
+        self.deliver()
+        timers = self.timers
+        while timers and timers[0][0] <= endTime:
+            when, order, timer = heapq.heappop(timers)
+            if timer.cancelled:
+                continue
+            self.now = max(self.now, when)
+            timer.callback(*timer.args)
+            self.deliver()
+        self.now = endTime
+
+    ##### Network #####
+    def add_router(self, id: int, routerClass=Router, **kwargs) -> Router:
+        kwargs.setdefault("verbose", False)
+        router = routerClass(id, self, Port(self, id), **kwargs)
+        self.routers[id] = router
+        return router
+
+    def remove_router(self, id: int): # Fail a router, neighbours only notice through LSA aging
+        self.routers.pop(id).transport.closed = True
+
+    def connect(self, aID: int, bID: int, cost: int=1):
+        self.routers[aID].add_link(bID, cost)
+        self.routers[bID].add_link(aID, cost)
+
+    def disconnect(self, aID: int, bID: int):
+        self.routers[aID].remove_link(bID)
+        self.routers[bID].remove_link(aID)
+
+    def deliver(self): # Deliver datagrams until nothing is in flight, datagrams to unknown IDs are lost
+        routers = self.routers
+        queue = self.queue
+        while queue:
+            dstID, srcID, dataBytes = queue.popleft()
+            if dstID in routers:
+                routers[dstID].handle_packet(dataBytes, srcID)
+
+    def step(self): # One simulated second
+        self.run_until(self.now + 1)
+
+    def converged(self) -> bool: # Every router has a route to every other router, inside a stub area to the
+        # routers of the area and a default route for the rest
+        n = len(self.routers) - 1
+        for router in self.routers.values():
+            table = router.sysRT.table
+            if DEFAULT_ID in table:
+                if not all(id in table for id in router.intra_IDs(next(iter(router.areas)))):
+                    return False
+            elif len(table) != n:
+                return False
+        return True
+
+    def run_until_converged(self, limit: int=600) -> float: # Return simulated seconds taken, None past limit
+        start = self.now
+        while not self.converged():
+            if self.now - start >= limit:
+                return None
+            self.step()
+        return self.now - start
+
+##### Topologies #####
+def ring(fabric, ids):
+    for i in range(len(ids)):
+        fabric.connect(ids[i], ids[(i + 1) % len(ids)])
+
+def grid(fabric, ids):
+    side = int(len(ids) ** 0.5)
+    for i, id in enumerate(ids):
+        if (i + 1) % side and i + 1 < len(ids):
+            fabric.connect(id, ids[i + 1])
+        if i + side < len(ids):
+            fabric.connect(id, ids[i + side])
+
+def random_graph(fabric, ids, degree: int=3, seed: int=1): # Spanning tree plus random links
+    rng = random.Random(seed)
+    for i in range(1, len(ids)):
+        fabric.connect(ids[i], ids[rng.randrange(i)], rng.randint(1, 10))
+    for i in range(len(ids) * (degree - 2) // 2):
+        aID, bID = rng.sample(ids, 2)
+        if bID not in fabric.routers[aID].linkTable:
+            fabric.connect(aID, bID, rng.randint(1, 10))
+
+TOPOLOGIES = {"ring": ring, "grid": grid, "random": random_graph}
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    topology = sys.argv[2] if len(sys.argv) > 2 else "grid"
+    routerClass = Router
+    if "agent" in sys.argv[3:]:
+        from agent import Agent
+        routerClass = Agent
+    fabric = Fabric()
+    ids = list(range(1, count + 1))
+    for id in ids:
+        fabric.add_router(id, routerClass)
+    TOPOLOGIES[topology](fabric, ids)
+
+    start = time.time()
+    simTime = fabric.run_until_converged()
+    print(count, "routers,", topology)
+    if simTime is None:
+        print("Not converged after 600 simulated seconds")
+        return
+    print("Converged in %d simulated seconds, %.1f s wall, %d datagrams" % (simTime, time.time() - start, fabric.sent))
+
+    # Steady state, only refreshes are flooded
+    counts = []
+    for i in range(60):
+        sent = fabric.sent
+        fabric.step()
+        counts.append(fabric.sent - sent)
+    print("Steady state over 60 s: %.0f datagrams/s on average, %d in the busiest second" % (sum(counts) / len(counts), max(counts)))
+
+    # Fail one link and wait for every route to be recomputed
+    aID = ids[0]
+    bID = next(iter(fabric.routers[aID].linkTable))
+    before = {id: dict(router.sysRT.table) for id, router in fabric.routers.items()}
+    start = time.time()
+    sent = fabric.sent
+    failTime = fabric.now
+    fabric.disconnect(aID, bID)
+    tables = before
+    lastChange = fabric.now
+    while fabric.now - lastChange < QUIET_TIME:
+        fabric.run_until(fabric.now + 0.5)
+        current = {id: dict(router.sysRT.table) for id, router in fabric.routers.items()}
+        if current != tables:
+            tables = current
+            lastChange = fabric.now
+    changed = sum(1 for id in tables if tables[id] != before[id])
+    print("Link %d-%d removed: %d routers changed routes, the last %.1f simulated s after, %.1f s wall, %d datagrams"
+          % (aID, bID, changed, lastChange - failTime, time.time() - start, fabric.sent - sent))
+    print("Peak memory: %.0f MB" % (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,240 @@
+# Control packet encodings shared by ospf.py and agent.py
+# Text packets:   "srcID,dstID\nTYPE\nbody" with a CSV-like body
+# Binary packets: fixed-size header (magic, type, srcID, dstID) followed by packed int32 arrays, the links of
+# an LSA go in the narrowest arrays that hold their IDs and costs
+# A DBD payload is (ddSeq, fragIndex, fragCount, {ID: Seq}), a DBD larger than one datagram is sent as
+# fragCount fragments of the same ddSeq. LSR and LSU payloads are lists, each packet stands on its own.
+# An ACK payload is a list of (ID, Seq) for the LSAs acknowledged.
+import struct
+from array import array
+from bisect import bisect_left
+from typing import NamedTuple
+
+MAGIC = 0xB5 # First byte of a binary packet, text packets start with a digit
+TYPES = ("DBD", "LSR", "LSU", "ACK") # Binary type codes are the index, HELLO is always text
+HEADER = struct.Struct("!BBii") # magic, type, srcID, dstID
+COUNT = struct.Struct("!i") # Number of entries that follow
+LSA_HEADER = struct.Struct("!iiHBB") # ID, Seq, number of links, bytes per link ID and per cost
+ID_FORMATS = {2: 'h', 4: 'i'} # Struct format of a link ID array by bytes per ID
+COST_FORMATS = {1: 'B', 2: 'H', 4: 'i'} # Struct format of a cost array by bytes per cost
+DBD_HEADER = struct.Struct("!iHH") # ddSeq, fragIndex, fragCount
+HEADER_ROOM = 64 # Bytes kept free in a datagram for headers
+
+class Links: # Link table {ID: Cost} of an LSA, read-only: the IDs in order, then their costs, in one int32 array
+    __slots__ = ("array",)
+
+    def __init__(self, linkTable=()): # {ID: Cost} or [(ID, Cost)]
+        links = sorted(dict(linkTable).items())
+        self.array = array('i', [linkID for linkID, cost in links] + [cost for linkID, cost in links])
+
+    def __len__(self) -> int:
+        return len(self.array) >> 1
+
+    def __iter__(self): # IDs in order
+        return iter(self.array[:len(self.array) >> 1])
+
+    def __contains__(self, id) -> bool:
+        links = self.array
+        n = len(links) >> 1
+        i = bisect_left(links, id, 0, n)
+        return i < n and links[i] == id
+
+    def __getitem__(self, id) -> int:
+        links = self.array
+        n = len(links) >> 1
+        i = bisect_left(links, id, 0, n)
+        if i < n and links[i] == id:
+            return links[n + i]
+        raise KeyError(id)
+
+    def get(self, id, default=None):
+        return self[id] if id in self else default
+
+    def keys(self):
+        return self.array[:len(self.array) >> 1]
+
+    def values(self):
+        return self.array[len(self.array) >> 1:]
+
+    def items(self): # (ID, Cost) in ID order
+        links = self.array
+        n = len(links) >> 1
+        return zip(links[:n], links[n:])
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Links):
+            return NotImplemented
+        return self.array == other.array
+
+    def __repr__(self) -> str:
+        return repr(dict(self.items()))
+
+class LSA(NamedTuple): # One router's link state, never changed once built so every table can share it
+    id: int
+    seq: int
+    linkTable: Links
+    time: float = 0 # When it was installed, 0 as parsed off the wire
+
+##### Text #####
+def text_DBD(payload) -> str: # (ddSeq, fragIndex, fragCount, {ID: Seq}) -> "ddSeq,fragIndex,fragCount\nID,Seq\n..."
+    ddSeq, fragIndex, fragCount, dbd = payload
+    lines = [str(ddSeq) + ',' + str(fragIndex) + ',' + str(fragCount)]
+    lines += [str(lsaID) + ',' + str(lsaSeq) for lsaID, lsaSeq in dbd.items()]
+    return '\n'.join(lines)
+
+def parse_DBD(text: str) -> tuple:
+    lines = text.split('\n')
+    ddSeq, fragIndex, fragCount = (int(i) for i in lines[0].split(','))
+    dbd = {}
+    for i in lines[1:]:
+        dbdID, dbdSeq = i.split(',')
+        dbd[int(dbdID)] = int(dbdSeq)
+    return ddSeq, fragIndex, fragCount, dbd
+
+def text_LSR(lsr) -> str: # [ID] -> "ID\n..."
+    return '\n'.join(str(reqID) for reqID in lsr)
+
+def parse_LSR(text: str) -> list:
+    return [int(reqID) for reqID in text.split('\n')]
+
+def text_LSU(lsu) -> str: # [LSA] -> "ID,Seq,linkID:cost;...\n..."
+    lines = []
+    for lsa in lsu:
+        strLink = ';'.join(str(linkID) + ':' + str(cost) for linkID, cost in lsa.linkTable.items())
+        lines.append(str(lsa.id) + ',' + str(lsa.seq) + ',' + strLink)
+    return '\n'.join(lines)
+
+def parse_LSU(text: str) -> list: # Return [LSA]
+    lsu = []
+    for i in text.split('\n'): # LSA per router
+        id, seq, strLink = i.split(',')
+        links = []
+        if strLink: # Router may have no links left
+            for j in strLink.split(';'): # For each link in linkTable
+                linkID, linkCost = j.split(':')
+                links.append((int(linkID), int(linkCost)))
+        lsu.append(LSA(int(id), int(seq), Links(links)))
+    return lsu
+
+def text_ACK(ack) -> str: # [(ID, Seq)] -> "ID,Seq\n..."
+    return '\n'.join(str(lsaID) + ',' + str(lsaSeq) for lsaID, lsaSeq in ack)
+
+def parse_ACK(text: str) -> list:
+    ack = []
+    for i in text.split('\n'):
+        lsaID, lsaSeq = i.split(',')
+        ack.append((int(lsaID), int(lsaSeq)))
+    return ack
+
+##### Binary #####
+def is_binary(data) -> bool:
+    return len(data) >= HEADER.size and data[0] == MAGIC
+
+def pack(pktType: str, srcID: int, dstID: int, body: bytes) -> bytes:
+    return HEADER.pack(MAGIC, TYPES.index(pktType), srcID, dstID) + body
+
+def unpack(data) -> tuple: # Return (srcID, dstID, pktType, body)
+    magic, typeCode, srcID, dstID = HEADER.unpack_from(data)
+    return srcID, dstID, TYPES[typeCode], memoryview(data)[HEADER.size:]
+
+def pack_DBD(payload) -> bytes:
+    ddSeq, fragIndex, fragCount, dbd = payload
+    flat = []
+    for lsaID, lsaSeq in dbd.items():
+        flat += (lsaID, lsaSeq)
+    return DBD_HEADER.pack(ddSeq, fragIndex, fragCount) + COUNT.pack(len(dbd)) + struct.pack("!%di" % len(flat), *flat)
+
+def unpack_DBD(body) -> tuple:
+    ddSeq, fragIndex, fragCount = DBD_HEADER.unpack_from(body)
+    n = COUNT.unpack_from(body, DBD_HEADER.size)[0]
+    flat = struct.unpack_from("!%di" % (2 * n), body, DBD_HEADER.size + COUNT.size)
+    return ddSeq, fragIndex, fragCount, dict(zip(flat[0::2], flat[1::2]))
+
+def pack_LSR(lsr) -> bytes:
+    return COUNT.pack(len(lsr)) + struct.pack("!%di" % len(lsr), *lsr)
+
+def unpack_LSR(body) -> list:
+    n = COUNT.unpack_from(body)[0]
+    return list(struct.unpack_from("!%di" % n, body, COUNT.size))
+
+def link_sizes(linkTable) -> tuple: # (bytes per link ID, bytes per cost), the narrowest arrays that hold the links
+    if not linkTable:
+        return 2, 1
+    low, high = min(linkTable), max(linkTable)
+    idSize = 2 if -0x8000 <= low and high < 0x8000 else 4
+    low, high = min(linkTable.values()), max(linkTable.values())
+    costSize = 1 if 0 <= low and high < 0x100 else 2 if 0 <= low and high < 0x10000 else 4
+    return idSize, costSize
+
+linkStructs = {} # Struct of the link arrays {(links, bytes per ID, bytes per cost): Struct}
+def link_struct(linkCount: int, idSize: int, costSize: int) -> struct.Struct: # Link IDs, then their costs
+    key = (linkCount, idSize, costSize)
+    linkStruct = linkStructs.get(key)
+    if linkStruct is None:
+        linkStruct = linkStructs[key] = struct.Struct("!%d%s%d%s" % (linkCount, ID_FORMATS[idSize], linkCount, COST_FORMATS[costSize]))
+    return linkStruct
+
+def pack_LSU(lsu) -> bytes:
+    parts = [COUNT.pack(len(lsu))]
+    for lsa in lsu:
+        linkTable = lsa.linkTable
+        n = len(linkTable)
+        idSize, costSize = link_sizes(linkTable)
+        parts.append(LSA_HEADER.pack(lsa.id, lsa.seq, n, idSize, costSize))
+        parts.append(link_struct(n, idSize, costSize).pack(*linkTable, *linkTable.values()))
+    return b''.join(parts)
+
+def unpack_LSU(body) -> list: # Return [LSA]
+    n = COUNT.unpack_from(body)[0]
+    offset = COUNT.size
+    lsu = []
+    for i in range(n):
+        id, seq, linkCount, idSize, costSize = LSA_HEADER.unpack_from(body, offset)
+        offset += LSA_HEADER.size
+        linkStruct = link_struct(linkCount, idSize, costSize)
+        flat = linkStruct.unpack_from(body, offset)
+        offset += linkStruct.size
+        lsu.append(LSA(id, seq, Links(zip(flat[:linkCount], flat[linkCount:]))))
+    return lsu
+
+def pack_ACK(ack) -> bytes:
+    flat = []
+    for lsaID, lsaSeq in ack:
+        flat += (lsaID, lsaSeq)
+    return COUNT.pack(len(ack)) + struct.pack("!%di" % len(flat), *flat)
+
+def unpack_ACK(body) -> list:
+    n = COUNT.unpack_from(body)[0]
+    flat = struct.unpack_from("!%di" % (2 * n), body, COUNT.size)
+    return list(zip(flat[0::2], flat[1::2]))
+
+##### Fragmentation #####
+def entry_size(pktType: str, entry) -> int: # Bytes of one entry in the larger of the two encodings
+    if pktType in ("DBD", "ACK"): # (ID, Seq)
+        return max(len(str(entry[0])) + len(str(entry[1])) + 2, 8)
+    if pktType == "LSR": # ID
+        return max(len(str(entry)) + 1, 4)
+    textSize = len(str(entry.id)) + len(str(entry.seq)) + 3 # LSA
+    for linkID, cost in entry.linkTable.items():
+        textSize += len(str(linkID)) + len(str(cost)) + 2
+    idSize, costSize = link_sizes(entry.linkTable)
+    return max(textSize, LSA_HEADER.size + (idSize + costSize) * len(entry.linkTable))
+
+def split(pktType: str, entries, maxSize: int) -> list: # Split DBD items/LSR IDs/LSU LSAs/ACK items into lists that fit in maxSize bytes
+    # An entry larger than maxSize on its own (LSA with a huge link table) gets a packet to itself
+    chunks = [] # No entries, no packets
+    size = maxSize
+    for entry in entries:
+        entrySize = entry_size(pktType, entry)
+        if not chunks or (chunks[-1] and size + entrySize > maxSize):
+            chunks.append([])
+            size = HEADER_ROOM
+        chunks[-1].append(entry)
+        size += entrySize
+    return chunks
+
+# Lookup by packet type
+TEXT = {"DBD": text_DBD, "LSR": text_LSR, "LSU": text_LSU, "ACK": text_ACK}
+PARSE = {"DBD": parse_DBD, "LSR": parse_LSR, "LSU": parse_LSU, "ACK": parse_ACK}
+PACK = {"DBD": pack_DBD, "LSR": pack_LSR, "LSU": pack_LSU, "ACK": pack_ACK}
+UNPACK = {"DBD": unpack_DBD, "LSR": unpack_LSR, "LSU": unpack_LSU, "ACK": unpack_ACK}
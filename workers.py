@@ -0,0 +1,118 @@
+# Worker processes forwarding data packets for a router, started with "workers <COUNT>"
+# Each worker binds the router's UDP port with SO_REUSEPORT. The kernel spreads datagrams over the workers
+# and the router's own socket by a hash of the sender's address and port, so all datagrams of one neighbour
+# land on the same socket and forwarding scales with cores only when traffic comes in over several links.
+# A worker forwards transit data packets itself, from the last FIB snapshot the router published: a copy
+# of its admitted IDs and routes, sent down a pipe after every change. Everything else goes to the router
+# over a Unix datagram socket with the sender's ID in front: control packets, packets for the router, and
+# destinations missing from the snapshot. The router handles those as if read from its own socket.
+# Data forwarded by a worker does not keep its neighbour alive, HELLOs do.
+import socket, struct, select, multiprocessing
+import batchio
+from ospf import Routing, UDP_IP, PORT_BASE, READ_BATCH, open_socket, peek_data
+
+RELAY_HEADER = struct.Struct("=i") # Sender ID in front of a datagram relayed to the router
+
+def worker_main(selfID: int, recvSize: int, fibConn, relaySock): # Forward until the router closes fibConn
+    sock = open_socket(selfID, reusePort=True)
+    batch = batchio.Batch(sock, UDP_IP, READ_BATCH, recvSize)
+    routing = Routing(selfID, log=lambda message: None)
+    admitIDs, routing.table = fibConn.recv()
+    table = routing.table
+    while True:
+        readable = select.select([sock, fibConn], [], [])[0]
+        if fibConn in readable:
+            try:
+                snapshot = fibConn.recv()
+            except EOFError:
+                snapshot = None
+            if snapshot is None:
+                break
+            admitIDs, routing.table = snapshot
+            table = routing.table
+        if sock not in readable:
+            continue
+        packets = []
+        for data, port in batch.recv():
+            fromID = port - PORT_BASE
+            if fromID not in admitIDs: # No link
+                continue
+            addr = peek_data(data)
+            if addr is not None and addr[1] != selfID and addr[1] in table:
+                nextHopID = routing.get_next_hop(addr[1], addr[0], fromID)
+                if nextHopID != fromID: # Avoid return to sender
+                    packets.append((data, PORT_BASE + nextHopID))
+                continue
+            try:
+                relaySock.sendmsg([RELAY_HEADER.pack(fromID), data], [], socket.MSG_DONTWAIT)
+            except OSError: # Router busy, dropped like on a full UDP socket
+                pass
+        batch.send(packets)
+    sock.close()
+
+class WorkerPool: # Worker processes of one UDPTransport and the relay they send to
+    def __init__(self, transport, count: int):
+        self.transport = transport
+        self.loop = transport.loop
+        self.count = count
+        router = transport.router
+        self.relay, workerEnd = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.relay.setblocking(False)
+        self.buf = memoryview(bytearray(RELAY_HEADER.size + router.recvBufSize))
+        self.publishing = False # Snapshot scheduled on the loop
+        self.conns = [] # Pipe to each worker, snapshots go down it
+        self.procs = []
+        context = multiprocessing.get_context("spawn") # Workers start clean, without the loop and sockets
+        for i in range(count):
+            recvConn, sendConn = context.Pipe(duplex=False)
+            proc = context.Process(target=worker_main, args=(router.selfID, router.recvBufSize, recvConn, workerEnd),
+                                   daemon=True)
+            proc.start()
+            recvConn.close()
+            self.conns.append(sendConn)
+            self.procs.append(proc)
+        workerEnd.close()
+        self.send_fib() # Workers wait for the first snapshot
+        self.loop.add_reader(self.relay.fileno(), self.relay_ready)
+
+    def relay_ready(self): # Relayed datagrams join the transport's control and data queues
+        buf = self.buf
+        for i in range(READ_BATCH):
+            try:
+                size = self.relay.recv_into(buf)
+            except OSError:
+                break
+            fromID, = RELAY_HEADER.unpack_from(buf)
+            self.transport.queue_packets([(buf[RELAY_HEADER.size:size], fromID)])
+        self.transport.handle_queued()
+
+    def publish(self): # Snapshot on the next loop iteration, changes until then share it
+        if not self.publishing:
+            self.publishing = True
+            self.loop.call_soon(self.send_fib)
+
+    def send_fib(self):
+        self.publishing = False
+        if not self.conns: # Closed meanwhile
+            return
+        snapshot = self.transport.router.fib_snapshot()
+        for conn in self.conns:
+            try:
+                conn.send(snapshot)
+            except OSError: # Worker gone
+                pass
+
+    def close(self):
+        self.loop.remove_reader(self.relay.fileno())
+        for conn in self.conns:
+            try:
+                conn.send(None)
+            except OSError:
+                pass
+            conn.close()
+        self.conns = []
+        for proc in self.procs:
+            proc.join(1)
+            if proc.is_alive():
+                proc.terminate()
+        self.relay.close()